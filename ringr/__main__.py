@@ -1,11 +1,27 @@
 import sys
+import time
+import signal
 import argparse
+from datetime import datetime
 from pathlib import Path
 import logging
 
-from .config import load_config
+import numpy as np
+
+from .config import (load_config, read_config_file, parse_device, DetectorConfig, RecorderConfig, MonitorConfig,
+                     EdgeConfig, CaptureConfig, EventsConfig)
 from .notifiers import create_notifier
-from .audio import AudioDetector
+from .audio import AudioDetector, SAMPLE_FULL_SCALE, get_fftsize
+from .recorder import FlightRecorder, read_records
+from .monitor import SpectrumMonitor
+from .features import (FeaturePublisher, FeatureReceiver, UDPFeaturePublisher, MQTTFeaturePublisher,
+                       UDPFeatureReceiver, MQTTFeatureReceiver)
+from .aggregator import Aggregator
+from .capture import CaptureRing, CaptureDaemon, RingAudioDetector
+from .classifier import train
+from .events import EventStore, query_events
+from .runtime import AsyncAudioDetector, AsyncRuntime
+from .exceptions import RingrDetectorError
 
 
 log = logging.getLogger('ringr')
@@ -28,21 +44,238 @@ def parse_args():
     parser.add_argument('-c', '--conf', help='Configuration file', metavar='file',
                         default=DEFAULT_CONFIG_FILE)
     parser.add_argument('-v', '--verbose', help='Show debug log messages in the log', action='store_true')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+
+    recorder_parser = subparsers.add_parser('recorder', help='Dump the records of the flight recorder')
+    recorder_parser.add_argument('path', nargs='?', help='Flight recorder directory. By default the configured one')
+    recorder_parser.add_argument('--start', help='Start of the time range (ISO 8601)', type=parse_datetime)
+    recorder_parser.add_argument('--end', help='End of the time range (ISO 8601)', type=parse_datetime)
+    recorder_parser.add_argument('-o', '--output', help='Save the records as a NumPy .npy file', metavar='file')
+
+    events_parser = subparsers.add_parser('events', help='Query the history of detected events')
+    events_parser.add_argument('path', nargs='?', help='Events database. By default the configured one')
+    events_parser.add_argument('--start', help='Start of the time range (ISO 8601)', type=parse_datetime)
+    events_parser.add_argument('--end', help='End of the time range (ISO 8601)', type=parse_datetime)
+    events_parser.add_argument('--rule', help='Only the events of this detection rule')
+    events_parser.add_argument('--summary', help='Number of events and peak magnitude of each rule',
+                               action='store_true')
+
+    subparsers.add_parser('aggregate', help='Run the detection on the features published by edge detectors')
+    subparsers.add_parser('capture', help='Capture the input device into shared memory for detector processes')
+
+    train_parser = subparsers.add_parser('train', help='Train the sound classifier with labelled WAV files')
+    train_parser.add_argument('-p', '--positive', help='Clips of the sound to detect', metavar='file', nargs='+',
+                              required=True)
+    train_parser.add_argument('-n', '--negative', help='Clips of other sounds of the place', metavar='file',
+                              nargs='+', required=True)
+    train_parser.add_argument('-o', '--output', help='Model file (.npz)', metavar='file', required=True)
+    train_parser.add_argument('--samplerate', help='Samplerate of the detector. By default the one of the '
+                              'configured device', type=float)
+    train_parser.add_argument('--mels', help='Number of mel bands', type=int, default=40)
+
     return parser.parse_args()
 
 
+def parse_datetime(value: str) -> float:
+    return datetime.fromisoformat(value).timestamp()
+
+
+def run_detector(args):
+    config = load_config(Path(args.conf))
+    notifier = create_notifier(config.notifier) if config.notifier else None
+    recorder = None
+    if config.recorder.path:
+        recorder = FlightRecorder(config.recorder.path, config.recorder.segment_size, config.recorder.max_segments)
+
+    if config.detector.source == 'capture':
+        if config.detector.runtime != 'thread':
+            raise RingrDetectorError('Detectors reading from the capture daemon only support the thread runtime')
+        detector = RingAudioDetector(config.detector, notifier, recorder, CaptureRing.attach(config.capture.name))
+    elif config.detector.source != 'device':
+        raise RingrDetectorError(f'Unsupported audio source: {config.detector.source}')
+    elif config.detector.runtime == 'asyncio':
+        detector = AsyncAudioDetector(config.detector, notifier, recorder)
+    elif config.detector.runtime == 'thread':
+        detector = AudioDetector(config.detector, notifier, recorder)
+    else:
+        raise RingrDetectorError(f'Unsupported runtime: {config.detector.runtime}')
+
+    event_store = None
+    if config.events.path:
+        event_store = EventStore(config.events.path, config.events.retention_days)
+        detector.event_store = event_store
+
+    if config.monitor.port is not None:
+        detector.monitor = create_monitor(config.monitor, detector)
+        detector.monitor.start()
+
+    if detector.mode == 'features':
+        detector.feature_publisher = create_feature_publisher(config.edge, detector)
+
+    log.info('Starting detector')
+
+    try:
+        if isinstance(detector, AsyncAudioDetector):
+            AsyncRuntime([detector]).run()
+        else:
+            detector.start()
+    finally:
+        if notifier:
+            notifier.close()
+        if recorder:
+            recorder.close()
+        if detector.monitor:
+            detector.monitor.stop()
+        if detector.feature_publisher:
+            detector.feature_publisher.close()
+        if isinstance(detector, RingAudioDetector):
+            detector.ring.close()
+        if event_store:
+            if detector.event:
+                # Event not finished yet
+                event_store.add(detector.event)
+            event_store.close()
+
+
+def create_monitor(config: MonitorConfig, detector: AudioDetector) -> SpectrumMonitor:
+    # Display the spectrum with the gain of the detector if any
+    scale = detector.magnitude_scale or 1 / detector.fftsize / SAMPLE_FULL_SCALE[detector.dtype]
+    info = {
+        'mode': detector.mode,
+        'samplerate': detector.samplerate,
+        'fftsize': detector.fftsize,
+        'channels': detector.channels,
+    }
+    return SpectrumMonitor(config.host, config.port, config.fps, config.bins,
+                           block_rate=detector.samplerate / detector.blocksize, scale=scale, info=info)
+
+
+def create_feature_publisher(config: EdgeConfig, detector: AudioDetector) -> FeaturePublisher:
+    if config.transport == 'udp':
+        return UDPFeaturePublisher(config.host, config.port, config.node_id, detector.samplerate, detector.fftsize)
+    elif config.transport == 'mqtt':
+        return MQTTFeaturePublisher(config.host, config.port, config.topic, config.mqtt_user, config.mqtt_pass,
+                                    config.node_id, detector.samplerate, detector.fftsize)
+    else:
+        raise RingrDetectorError(f'Unsupported feature transport: {config.transport}')
+
+
+def create_feature_receiver(config: EdgeConfig) -> FeatureReceiver:
+    if config.transport == 'udp':
+        return UDPFeatureReceiver(config.host, config.port)
+    elif config.transport == 'mqtt':
+        return MQTTFeatureReceiver(config.host, config.port, config.topic, config.mqtt_user, config.mqtt_pass,
+                                   f'{config.node_id}_aggregator')
+    else:
+        raise RingrDetectorError(f'Unsupported feature transport: {config.transport}')
+
+
+def run_aggregator(args):
+    config = load_config(Path(args.conf))
+    notifier = create_notifier(config.notifier)
+    aggregator = Aggregator(config.detector, notifier, create_feature_receiver(config.edge))
+
+    log.info('Starting aggregator')
+
+    try:
+        aggregator.start()
+    finally:
+        notifier.close()
+
+
+def run_capture(args):
+    parser = read_config_file(Path(args.conf))
+    capture_config = CaptureConfig.configure(parser)
+    daemon = CaptureDaemon(DetectorConfig.configure(parser), capture_config.name, capture_config.slots)
+    try:
+        daemon.start()
+    finally:
+        daemon.close()
+
+
+def run_train(args):
+    parser = read_config_file(Path(args.conf))
+    samplerate = args.samplerate or AudioDetector.get_samplerate(parse_device(parser.get('detector', 'device')))
+    num_freq_bins = parser.getint('detector', 'frequency_bins', fallback=DetectorConfig.num_freq_bins)
+    fftsize = get_fftsize(samplerate, num_freq_bins)
+
+    classifier, accuracy = train(args.positive, args.negative, samplerate, fftsize, num_mels=args.mels)
+    classifier.save(args.output)
+
+    spectrum = np.random.rand(fftsize // 2 + 1, 1)
+    start = time.perf_counter()
+    for _ in range(1000):
+        classifier.predict(spectrum)
+    print(f'Model saved to {args.output}. Accuracy on the training clips: {accuracy:.3f}. '
+          f'Evaluation time: {(time.perf_counter() - start) * 1000:.1f} us per block')
+
+
+def run_events(args):
+    path = args.path or EventsConfig.configure(read_config_file(Path(args.conf))).path
+    if not path:
+        raise ValueError('No events database configured')
+
+    events = query_events(path, args.start, args.end, args.rule)
+    if args.summary:
+        rules = {}
+        for event in events:
+            rules.setdefault(event['rule'], []).append(event)
+        for rule, rule_events in rules.items():
+            peaks = [event['peak_magnitude'] for event in rule_events]
+            notified = sum(1 for event in rule_events if event['notified'])
+            print(f'{rule}\t{len(rule_events)} events\t{notified} notified\t'
+                  f'peak magnitude: mean {np.mean(peaks):.4f}, max {np.max(peaks):.4f}')
+        return
+
+    for event in events:
+        end = datetime.fromtimestamp(event['end']).isoformat() if event['end'] is not None else '-'
+        hit_ratio = f"{event['hit_ratio']:.2f}" if event['hit_ratio'] is not None else '-'
+        notified = {None: '-', 0: 'failed', 1: 'notified'}[event['notified']]
+        print(f"{datetime.fromtimestamp(event['start']).isoformat()}\t{end}\t{event['rule']}\t"
+              f"{event['peak_magnitude']:.4f}\t{hit_ratio}\t{notified}")
+
+
+def run_recorder(args):
+    path = args.path or RecorderConfig.configure(read_config_file(Path(args.conf))).path
+    if not path:
+        raise ValueError('No flight recorder path configured')
+
+    records = read_records(path, args.start, args.end)
+    if args.output:
+        np.save(args.output, records)
+        return
+
+    for record in records:
+        magnitudes = ' '.join(f'{magnitude:.4f}' for magnitude in record['magnitude'])
+        print(f"{datetime.fromtimestamp(record['time']).isoformat()}\t{record['block']}\t{magnitudes}\t"
+              f"{record['hits']}\t{record['state']}")
+
+
+def terminate(signum, frame):
+    # Stopped by systemd or docker: leave through the cleanup of the running command, without interrupting it again
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise SystemExit(0)
+
+
 def main():
     args = parse_args()
     configure_logger(args.verbose)
+    # The asyncio runtime installs its own handlers while it is running
+    signal.signal(signal.SIGTERM, terminate)
 
     try:
-        config = load_config(Path(args.conf))
-        notifier = create_notifier(config.notifier)
-        detector = AudioDetector(config.detector, notifier)
-
-        log.info('Starting detector')
-
-        detector.start()
+        if args.command == 'recorder':
+            run_recorder(args)
+        elif args.command == 'events':
+            run_events(args)
+        elif args.command == 'aggregate':
+            run_aggregator(args)
+        elif args.command == 'capture':
+            run_capture(args)
+        elif args.command == 'train':
+            run_train(args)
+        else:
+            run_detector(args)
 
     except (KeyboardInterrupt, SystemExit):
         # Do nothing
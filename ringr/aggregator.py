@@ -0,0 +1,159 @@
+import time
+import logging
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .config import DetectorConfig
+from .features import FeatureReceiver, FeatureFrame, decode_frame, band_index
+from .notifiers import Notifier
+from .exceptions import RingrDetectorError
+
+
+log = logging.getLogger('ringr')
+
+
+class NodeBank:
+    """
+    Sliding windows, detection state and cooldown of many edge detectors, evaluated with array operations.
+
+    Each row of the arrays belongs to one node. It follows the same rules as ``AudioDetector`` in frequency mode.
+    """
+
+    def __init__(self, peak_blocks: int, acceptable_peak_blocks: float, threshold: float, cooldown_secs: float,
+                 capacity: int = 16) -> None:
+        self.peak_blocks = peak_blocks
+        self.acceptable_peak_blocks = acceptable_peak_blocks
+        self.threshold = threshold
+        self.cooldown_secs = cooldown_secs
+
+        self.nodes: Dict[str, int] = {}
+        self.windows = np.zeros((capacity, peak_blocks), dtype=bool)
+        self.position = np.zeros(capacity, dtype=np.int64)
+        self.filled = np.zeros(capacity, dtype=np.int64)
+        self.hits = np.zeros(capacity, dtype=np.int64)
+        self.state = np.zeros(capacity, dtype=bool)
+        self.last_detection_time = np.zeros(capacity)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def add_node(self, node_id: str) -> int:
+        index = len(self.nodes)
+        if index == len(self.state):
+            self._grow()
+        self.nodes[node_id] = index
+        return index
+
+    def _grow(self) -> None:
+        for name in ('windows', 'position', 'filled', 'hits', 'state', 'last_detection_time'):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+
+    def update(self, index: np.ndarray, values: np.ndarray, times: np.ndarray) -> List[Tuple[int, bool]]:
+        """
+        Process one block of each node in ``index`` (without duplicates). Returns the state changes as a list of
+        (node index, state) in notification order.
+        """
+        matches = values > self.threshold
+        position = self.position[index]
+        self.hits[index] += matches.astype(np.int64) - self.windows[index, position]
+        self.windows[index, position] = matches
+        self.position[index] = (position + 1) % self.peak_blocks
+        self.filled[index] = np.minimum(self.filled[index] + 1, self.peak_blocks)
+        detected = (self.filled[index] >= self.peak_blocks) & (self.hits[index] >= self.acceptable_peak_blocks)
+
+        state = self.state[index]
+        cooldown = state & ((times - self.last_detection_time[index]) < self.cooldown_secs)
+        reset = index[state & ~cooldown]
+        new_detections = ~cooldown & detected
+        detections = index[new_detections]
+
+        self.state[reset] = False
+        self.state[detections] = True
+        self.last_detection_time[detections] = times[new_detections]
+        return [(i, False) for i in reset] + [(i, True) for i in detections]
+
+
+class Aggregator:
+    """ Runs the detection rules centrally on the features published by many edge detectors """
+
+    def __init__(self, config: DetectorConfig, notifier: Notifier, receiver: FeatureReceiver,
+                 tick: float = 0.05) -> None:
+        if config.mode != 'frequency':
+            raise RingrDetectorError('The aggregator only supports the frequency mode')
+        if not config.frequency or not config.threshold or not config.peak_duration:
+            raise RingrDetectorError('The frequency, threshold and peak duration are required')
+
+        self.config = config
+        self.notifier = notifier
+        self.receiver = receiver
+        self.tick = tick
+        self.frequency = config.frequency
+        self.threshold = config.threshold / 100.0
+        # Nodes must use the same block duration than the aggregator
+        peak_blocks = int(config.peak_duration * 1000 / config.block_duration)
+        self.bank = NodeBank(peak_blocks, peak_blocks * config.acceptance_ratio / 100.0, self.threshold,
+                             config.cooldown_secs)
+        self.bands: List[int] = []  # band to evaluate of each node
+        self.layouts: List[tuple] = []  # samplerate, FFT size and number of bands the band was computed for
+        self.last_state = None
+        self.update_state(False)
+
+    def start(self) -> None:
+        self.receiver.start()
+        while True:
+            time.sleep(self.tick)
+            self.process(self.receiver.drain())
+
+    def process(self, packets: List[bytes]) -> None:
+        frames = []
+        for packet in packets:
+            try:
+                frames.append(decode_frame(packet))
+            except RingrDetectorError:
+                log.debug('Discarded invalid feature frame')
+        if not frames:
+            return
+
+        index = np.array([self.get_node(frame) for frame in frames])
+        values = np.array([frame.bands[self.bands[i]] for i, frame in zip(index, frames)]) / 255.0
+        times = np.array([frame.stream_time for frame in frames])
+
+        # Frames of the same node must be processed in order, one per round
+        order = np.lexsort((np.array([frame.block for frame in frames]), index))
+        index, values, times = index[order], values[order], times[order]
+        first = np.searchsorted(index, index)
+        rounds = np.arange(len(index)) - first
+        changes = []
+        for r in range(rounds.max() + 1):
+            selected = rounds == r
+            changes += self.bank.update(index[selected], values[selected], times[selected])
+
+        if changes:
+            node_ids = list(self.bank.nodes)
+            for i, state in changes:
+                log.info('Node %s: sound event %s', node_ids[i], 'detected' if state else 'finished')
+            detected = bool(self.bank.state[:len(self.bank)].any())
+            if detected != self.last_state:
+                self.update_state(detected)
+
+    def get_node(self, frame: FeatureFrame) -> int:
+        layout = (frame.samplerate, frame.fftsize, len(frame.bands))
+        index = self.bank.nodes.get(frame.node_id)
+        if index is None:
+            index = self.bank.add_node(frame.node_id)
+            self.bands.append(band_index(self.frequency, *layout))
+            self.layouts.append(layout)
+            log.info('New node: %s', frame.node_id)
+        elif self.layouts[index] != layout:
+            # The node was restarted with other settings (e.g. feature_bands)
+            self.bands[index] = band_index(self.frequency, *layout)
+            self.layouts[index] = layout
+            log.info('Node %s: feature layout changed', frame.node_id)
+        return index
+
+    def update_state(self, new_state: bool) -> None:
+        self.last_state = new_state
+        self.notifier.notify(new_state)
@@ -2,18 +2,66 @@ import math
 import time
 import logging
 
-from typing import Any
+from functools import partial
+from typing import Any, Callable, Optional, Sequence, Union
 
 import sounddevice as sd
 import numpy as np
 
 from .config import DetectorConfig
-from .notifiers import Notifier
+from .notifiers import Detection, Notifier
+from .recorder import FlightRecorder
+from .events import Event, EventStore
+from .template import SpectralTemplate
+from .classifier import SoundClassifier
+from .monitor import SpectrumMonitor
+from .features import FeaturePublisher, downsample
+from .exceptions import RingrDetectorError
 
 
 log = logging.getLogger('ringr')
 
 
+# Full scale value of each supported sample format
+SAMPLE_FULL_SCALE = {
+    'int16': 2 ** 15,
+    'int32': 2 ** 31,
+    'float32': 1.0,
+}
+
+
+def get_fftsize(samplerate: float, num_freq_bins: int) -> int:
+    """ FFT size to get ``num_freq_bins`` bins between 0 Hz and the Nyquist frequency """
+    return math.ceil(samplerate / (samplerate / 2 / (num_freq_bins - 1)))
+
+
+def reinitialize_portaudio() -> None:
+    """ Refresh the list of devices of PortAudio, e.g. after a device is plugged again. All the streams are closed """
+    sd._terminate()
+    sd._initialize()
+
+
+class Backoff:
+    """ Exponential delay between the attempts to recover from a failure """
+
+    def __init__(self, initial: float, maximum: float) -> None:
+        self.initial = initial
+        self.maximum = maximum
+        self.delay = initial
+        self.next_attempt = 0.0  # monotonic time
+
+    def ready(self) -> bool:
+        return time.monotonic() >= self.next_attempt
+
+    def failed(self) -> None:
+        self.next_attempt = time.monotonic() + self.delay
+        self.delay = min(self.delay * 2, self.maximum)
+
+    def reset(self) -> None:
+        self.delay = self.initial
+        self.next_attempt = 0.0
+
+
 class SlidingWindow:
     def __init__(self, size):
         self.size = size
@@ -31,10 +79,87 @@ class SlidingWindow:
         return str(self.window)
 
 
+class ToneSequence:
+    """
+    Incremental matcher of an ordered sequence of tones, e.g. the two tones of a "ding-dong" chime.
+
+    Each tone must last between its minimum and maximum number of blocks and it must start at most ``max_gap`` blocks
+    after the end of the previous one. The state is updated in constant time per block.
+    """
+
+    def __init__(self, min_blocks: Sequence[int], max_blocks: Sequence[int], max_gap: int) -> None:
+        self.min_blocks = min_blocks
+        self.max_blocks = max_blocks
+        self.max_gap = max_gap
+        self.last_step = len(min_blocks) - 1
+        self.step = 0  # tone being matched
+        self.run = 0  # consecutive blocks of the current tone
+        self.gap = 0  # blocks since the end of the previous tone
+        self.held_tone = None  # tone too long, ignored until it stops
+
+    def reset(self) -> None:
+        self.step = 0
+        self.run = 0
+        self.gap = 0
+
+    def add(self, matches: Sequence[bool]) -> bool:
+        """ Process the tones present in a block. Returns True when the last tone of the sequence is matched """
+        if self.held_tone is not None:
+            if matches[self.held_tone]:
+                return False
+            self.held_tone = None
+
+        if self.run:
+            if matches[self.step]:
+                self.run += 1
+                if self.run > self.max_blocks[self.step]:
+                    self.held_tone = self.step
+                    self.reset()
+                    return False
+                return self.completed()
+            if self.run < self.min_blocks[self.step]:
+                # Too short, the block may be the start of a new sequence
+                self.reset()
+                return self.add(matches)
+            self.step += 1
+            self.run = 0
+            self.gap = 0
+
+        if matches[self.step]:
+            self.run = 1
+            return self.completed()
+        if self.step > 0 and matches[0]:
+            # The first tone sounds again (e.g. repeated or echoed), the sequence starts over from it
+            self.reset()
+            self.run = 1
+            return self.completed()
+        if self.step > 0:
+            self.gap += 1
+            if self.gap > self.max_gap:
+                self.reset()
+                return self.add(matches)
+        return False
+
+    def completed(self) -> bool:
+        if self.step == self.last_step and self.run >= self.min_blocks[self.step]:
+            self.reset()
+            return True
+        return False
+
+
 class AudioDetector:
-    def __init__(self, config: DetectorConfig, notifier: Notifier) -> None:
+    max_retry_delay = 30  # seconds between the attempts to reopen a missing device
+
+    def __init__(self, config: DetectorConfig, notifier: Optional[Notifier],
+                 recorder: Optional[FlightRecorder] = None) -> None:
         self.config = config
         self.notifier = notifier
+        self.recorder = recorder
+        self.monitor: Optional[SpectrumMonitor] = None
+        self.feature_publisher: Optional[FeaturePublisher] = None
+        self.event_store: Optional[EventStore] = None
+        self.event: Optional[Event] = None  # ongoing event
+        self.spectrum = None  # magnitude spectrum of the last analyzed block
 
         self.device = self.config.device
         self.threshold = self.config.threshold / 100.0
@@ -45,14 +170,50 @@ class AudioDetector:
         self.block_duration = self.config.block_duration
         self.gain = self.config.gain
         self.latency = 'high' if self.config.latency is None else self.config.latency
+        self.channels = list(self.config.channels)
+        self.channel_policy = self.config.channel_policy
+        self.channel_votes = min(max(self.config.channel_votes, 1), len(self.channels))
+        if self.channel_policy not in ('max', 'mean', 'vote'):
+            raise RingrDetectorError(f'Unsupported channel policy: {self.channel_policy}')
+        self.dtype = self.config.dtype
+        if self.dtype not in SAMPLE_FULL_SCALE:
+            raise RingrDetectorError(f'Unsupported sample format: {self.dtype}')
 
         self.samplerate = self.get_samplerate(self.device)
+        # Devices may get a different index when they are plugged again, they are reopened by name
+        self.device_name = self.get_device_name(self.device)
         self.blocksize = int(self.samplerate * self.block_duration / 1000)
+        block_time = self.blocksize / self.samplerate
+        if self.config.watchdog is None:
+            # Several callback periods, plus the latency of the stream
+            self.watchdog = max(0.5, 4 * block_time + (self.config.latency or 0))
+        elif 0 < self.config.watchdog <= block_time:
+            raise RingrDetectorError(f'The watchdog ({self.config.watchdog} s) must be longer than the block duration '
+                                     f'({block_time} s)')
+        else:
+            self.watchdog = self.config.watchdog
+        # Reinitializing PortAudio interrupts all the streams, it is retried less often while the device is missing
+        self.backoff = Backoff(self.watchdog, self.max_retry_delay)
         self.peak_blocks = int(self.samplerate * self.peak_duration / self.blocksize)
         self.acceptable_peak_blocks = self.peak_blocks * self.acceptance_ratio / 100.0
         self.sliding_window = SlidingWindow(self.peak_blocks)
+        self.num_matches = 0
+        self.confidence = 0.0  # magnitude of the rule in the last analyzed block
         self.last_detection_time = 0
 
+        # Timekeeping is based on the stream time: ADC time of the first sample of each block provided by
+        # PortAudio or, if the host API does not provide it, the number of captured frames
+        self.stream = None
+        self.available = True
+        self.last_callback = 0.0  # monotonic time of the last callback of the stream
+        self.resync = False  # the stream was reopened, its clock must be related to the previous one
+        self.frames = 0
+        self.blocks = 0
+        self.adc_clock = False
+        self.stream_time = 0
+        self.time_offset = 0  # wall-clock time - stream time
+        self.detection_latency = None
+
         # Notes:
         #   samplerate / 2: maximum frequency that can be correctly captured
         #   num_freq_bins: number of bins for the fft
@@ -60,44 +221,186 @@ class AudioDetector:
         #   freq_bin_idx: bin index for the desired frequency to analyze
         max_freq = self.samplerate / 2
         delta_f = max_freq / (self.num_freq_bins - 1)
-        self.fftsize = math.ceil(self.samplerate / delta_f)
-        self.freq_bin_idx = math.ceil(self.frequency / delta_f)
+        self.fftsize = get_fftsize(self.samplerate, self.num_freq_bins)
+        self.delta_f = delta_f
+        self.freq_bin_idx = self.get_freq_bin_idx(self.frequency)
+        # The full scale of the capture format is folded into the scale of the magnitudes. The FFT converts the samples
+        # to float64 in any case
+        self.magnitude_scale = self.gain / self.fftsize / SAMPLE_FULL_SCALE[self.dtype]
+
+        # Optional classification stage that gates the matches of the detection rule
+        self.classifier = None
+        self.probability = 1.0  # probability of the sound in the last analyzed block
+        if self.config.classifier:
+            self.classifier = SoundClassifier.load(self.config.classifier, self.samplerate, self.fftsize)
+
+        self.mode = self.config.mode
+        self.template = None
+        self.tone_sequence = None
+        self.sequence_bins = [self.get_freq_bin_idx(frequency) for frequency, _ in self.config.sequence]
+        if self.mode in ('frequency', 'template', 'sequence') and not self.threshold:
+            raise RingrDetectorError(f'A threshold is required in {self.mode} mode')
+        if self.mode in ('frequency', 'template') and not self.peak_duration:
+            raise RingrDetectorError(f'A peak duration is required in {self.mode} mode')
+        if self.mode == 'frequency':
+            if not self.frequency:
+                raise RingrDetectorError('A frequency is required in frequency mode')
+        elif self.mode == 'template':
+            if not self.config.template:
+                raise RingrDetectorError('A template clip is required in template mode')
+            self.template = SpectralTemplate.from_wav(self.config.template, self.samplerate, self.fftsize)
+        elif self.mode == 'sequence':
+            if not self.config.sequence:
+                raise RingrDetectorError('A sequence of tones is required in sequence mode')
+            self.tone_sequence = self.create_tone_sequence()
+        elif self.mode == 'features':
+            # Detection runs in a central aggregator (see ringr.aggregator)
+            pass
+        else:
+            raise RingrDetectorError(f'Unsupported detector mode: {self.mode}')
 
         self.last_state = None
         self.update_state(False)
 
+    def get_freq_bin_idx(self, frequency: float) -> int:
+        return math.ceil(frequency / self.delta_f)
+
+    def create_tone_sequence(self) -> ToneSequence:
+        block_secs = self.blocksize / self.samplerate
+        tolerance = self.config.sequence_tolerance
+        min_blocks = [max(1, round(duration * (1 - tolerance) / block_secs)) for _, duration in self.config.sequence]
+        max_blocks = [round(duration * (1 + tolerance) / block_secs) for _, duration in self.config.sequence]
+        max_gap = round(self.config.sequence_gap / block_secs)
+        return ToneSequence(min_blocks, max_blocks, max_gap)
+
     @staticmethod
-    def get_samplerate(device: int) -> int:
+    def get_samplerate(device: Union[int, str]) -> int:
         """ Get default samplerate of the input sound device """
         return sd.query_devices(device, 'input')['default_samplerate']
 
+    @staticmethod
+    def get_device_name(device: Union[int, str]) -> str:
+        return sd.query_devices(device, 'input')['name']
+
     def start(self) -> None:
-        with sd.InputStream(
+        self.start_stream(self.callback)
+        try:
+            while True:
+                time.sleep(self.watchdog / 2 if self.watchdog else 1)
+                if self.watchdog and self.stream_stalled() and self.backoff.ready():
+                    self.stream_lost()
+                    self.close_stream()
+                    if not self.reopen_stream(self.callback):
+                        # Plugged devices only show up after reinitializing PortAudio
+                        reinitialize_portaudio()
+                        if not self.reopen_stream(self.callback):
+                            self.backoff.failed()
+        finally:
+            self.close_stream()
+
+    def start_stream(self, callback: Callable) -> None:
+        self.stream = self.open_stream(callback)
+        self.stream.start()
+        self.last_callback = time.monotonic()
+
+    def close_stream(self) -> None:
+        if self.stream is not None:
+            self.stream.close(ignore_errors=True)
+            self.stream = None
+
+    def stream_stalled(self) -> bool:
+        """ The stream was stopped (e.g. the device was unplugged) or its callback is no longer called """
+        return (self.stream is None or not self.stream.active or
+                time.monotonic() - self.last_callback > self.watchdog)
+
+    def stream_lost(self) -> None:
+        if self.available:
+            log.warning('Audio stream stalled. Reopening input device: %s', self.device_name)
+            self.set_availability(False)
+
+    def reopen_stream(self, callback: Callable) -> bool:
+        """ Open the stream of the device again. Returns False if the device is not available yet """
+        try:
+            samplerate = self.get_samplerate(self.device_name)
+            if samplerate != self.samplerate:
+                log.warning('Default samplerate of %s changed to %s. Using %s', self.device_name, samplerate,
+                            self.samplerate)
+            self.device = self.device_name
+            self.start_stream(callback)
+        except (sd.PortAudioError, ValueError) as e:
+            log.debug('Unable to open input device %s: %s', self.device_name, e)
+            self.close_stream()
+            return False
+        self.resync = True
+        self.backoff.reset()
+        if not self.available:
+            log.info('Audio stream reopened')
+            self.set_availability(True)
+        return True
+
+    def set_availability(self, available: bool) -> None:
+        self.available = available
+        if self.notifier is not None:
+            self.notifier.set_availability(available)
+
+    def open_stream(self, callback: Callable) -> sd.InputStream:
+        return sd.InputStream(
             device=self.device,
-            channels=1,
+            channels=max(self.channels) + 1,
             samplerate=self.samplerate,
             blocksize=self.blocksize,
+            dtype=self.dtype,
             latency=self.latency,
-            callback=self.callback
-        ):
-            while True:
-                time.sleep(1)
+            callback=callback
+        )
 
     def callback(self, indata: np.ndarray, frames: int, stime: Any, status: sd.CallbackFlags) -> None:
         """This is called (from a separate thread) for each audio block."""
+        self.last_callback = time.monotonic()
         if status:
             log.error('Error status: %s', status)
-        if any(indata):
-            self.analyze(indata)
+        self.process_block(indata, frames, stime.inputBufferAdcTime)
+
+    def process_block(self, data: np.ndarray, frames: int, adc_time: float) -> None:
+        self.adc_clock = bool(adc_time)
+        stream_time = adc_time if self.adc_clock else self.frames / self.samplerate
+        self.frames += frames
+        if data.any():
+            self.analyze(data, stream_time)
         else:
             log.debug('No input')
 
-    def analyze(self, data: np.ndarray) -> None:
+    def analyze(self, data: np.ndarray, stream_time: float) -> None:
+        self.blocks += 1
+        self.stream_time = stream_time
+        if self.blocks == 1:
+            # Reference to convert stream times to wall-clock times
+            self.time_offset = time.time() - stream_time
+        elif self.resync:
+            # The clock of a reopened stream may start again from 0
+            time_offset = time.time() - stream_time
+            self.last_detection_time += self.time_offset - time_offset
+            self.time_offset = time_offset
+            self.resync = False
         magnitude = self.get_fft_magnitude(data)
-        detected = self.process_value(magnitude)
+        if self.mode == 'features':
+            self.feature_publisher.publish(self.blocks, stream_time, magnitude)
+        else:
+            if self.classifier is not None:
+                self.probability = self.classify(self.spectrum)
+            detected = self.process_value(magnitude)
+            self.process_detection(detected)
+            if self.event is not None:
+                self.event.peak_magnitude = max(self.event.peak_magnitude, self.confidence)
+        if self.recorder:
+            self.record(magnitude)
+        if self.monitor:
+            self.monitor.publish(self.spectrum, magnitude, self.threshold)
+
+    def process_detection(self, detected: bool) -> None:
         # Cooldown reset check
         if self.last_state:
-            if (time.time() - self.last_detection_time) < self.config.cooldown_secs:
+            if (self.stream_time - self.last_detection_time) < self.config.cooldown_secs:
                 # Do nothing during cooldown time
                 return
             else:
@@ -105,28 +408,141 @@ class AudioDetector:
         # Detection
         if detected:
             log.info('Sound event detected')
-            self.last_detection_time = time.time()
+            self.last_detection_time = self.stream_time
             self.update_state(True)
 
     def get_fft_magnitude(self, data: np.ndarray) -> float:
-        magnitudes = np.abs(np.fft.rfft(data[:, 0], n=self.fftsize))
-        magnitude = magnitudes[self.freq_bin_idx]
-        magnitude *= self.gain / self.fftsize
+        # A single batched FFT for all the analyzed channels
+        magnitudes = np.abs(np.fft.rfft(data[:, self.channels], n=self.fftsize, axis=0))
+        self.spectrum = magnitudes
+        if self.template is not None:
+            # Correlation with the fingerprint of the reference clip, independent of the gain
+            magnitude = self.combine_channels(self.template.match(magnitudes))
+        elif self.mode == 'features':
+            # Magnitude of each band of the spectrum
+            magnitude = downsample(self.combine_channels(magnitudes), self.config.feature_bands)
+            magnitude *= self.magnitude_scale
+        elif self.tone_sequence is not None:
+            # One magnitude per tone of the sequence
+            magnitude = self.combine_channels(magnitudes[self.sequence_bins])
+            magnitude *= self.magnitude_scale
+        else:
+            magnitude = self.combine_channels(magnitudes[self.freq_bin_idx])
+            magnitude *= self.magnitude_scale
         magnitude = np.clip(magnitude, 0, 1)  # normalized between 0 and 1, limit values
         return magnitude
 
+    def classify(self, magnitudes: np.ndarray) -> float:
+        # The classifier is trained on normalized spectrums, without gain
+        probability = self.classifier.predict(magnitudes / self.fftsize / SAMPLE_FULL_SCALE[self.dtype])
+        return float(self.combine_channels(probability))
+
+    def combine_channels(self, values: np.ndarray) -> np.ndarray:
+        """ Combine the values of each channel (last axis) into a single one """
+        if self.channel_policy == 'mean':
+            return values.mean(axis=-1)
+        elif self.channel_policy == 'vote':
+            # The k-th highest value is above the threshold only if at least k channels are above it
+            return np.partition(values, -self.channel_votes, axis=-1)[..., -self.channel_votes]
+        else:
+            return values.max(axis=-1)
+
     def process_value(self, value: float) -> bool:
         matches = value > self.threshold
+        if self.classifier is not None:
+            matches = matches & (self.probability >= self.config.classifier_threshold)
+        self.confidence = float(np.max(value))
+        if self.tone_sequence is not None:
+            detected = self.tone_sequence.add(matches)
+            # Tones matched so far. The sequence is reset once it is completed
+            self.num_matches = self.tone_sequence.last_step + 1 if detected else self.tone_sequence.step
+            return detected
         self.sliding_window.add(matches)
         if len(self.sliding_window) < self.peak_blocks:
             # We need more samples to take a decision
             return False
         num_matches = self.sliding_window.window.count(True)
+        self.num_matches = num_matches
         if self.config.log_analysis:
             log.debug('Value %s - Threshold %s - num_matches %s - acceptable %s', value, self.threshold,
                       num_matches, self.acceptable_peak_blocks)
         return num_matches >= self.acceptable_peak_blocks
 
+    def record(self, magnitude: float) -> None:
+        self.recorder.append(self.blocks, self.time_offset + self.stream_time, magnitude, self.num_matches,
+                             self.last_state)
+
+    def report_latency(self, stream_time: float) -> None:
+        """ Time since the detected block hit the ADC until its notification was delivered """
+        if self.stream is not None and self.adc_clock:
+            self.detection_latency = self.stream.time - stream_time
+            log.info('Detection latency: %.1f ms', self.detection_latency * 1000)
+
     def update_state(self, new_state: bool):
         self.last_state = new_state
-        self.notifier.notify(new_state)
+        if self.event_store is not None:
+            self.track_event(new_state)
+        self.notify(new_state)
+
+    def track_event(self, state: bool) -> None:
+        if state:
+            self.event = Event(
+                start=self.time_offset + self.stream_time,
+                stream_start=self.stream_time,
+                rule=self.rule,
+                peak_magnitude=self.confidence,
+                hit_ratio=self.hit_ratio,
+            )
+        elif self.event is not None:
+            self.event.end = self.time_offset + self.stream_time
+            self.event.stream_end = self.stream_time
+            self.event_store.add(self.event)
+            self.event = None
+
+    @property
+    def hit_ratio(self) -> Optional[float]:
+        """ Hits of the sliding window or tones of the sequence matched, over their total. None without a window """
+        if self.tone_sequence is not None:
+            return self.num_matches / (self.tone_sequence.last_step + 1)
+        return self.num_matches / self.peak_blocks if self.peak_blocks else None
+
+    @property
+    def rule(self) -> str:
+        """ Description of the detection rule """
+        if self.mode == 'template':
+            return f'template:{self.config.template}'
+        elif self.mode == 'sequence':
+            return 'sequence:' + ','.join(f'{frequency}:{duration}' for frequency, duration in self.config.sequence)
+        return f'{self.mode}:{self.frequency}'
+
+    def notify(self, state: bool) -> Optional[bool]:
+        """
+        Returns whether the notifier accepted the state, or None if there is no notifier. The outcome of the
+        notification of a detection is reported later to ``notified``
+        """
+        if self.notifier is None:
+            return None
+        callback = partial(self.notified, self.stream_time, self.event) if state else None
+        try:
+            self.notifier.notify(state, self.get_detection() if state else None, callback)
+        except Exception:
+            log.error('Unable to notify state: %s', state, exc_info=True)
+            if callback is not None:
+                callback(False)
+            return False
+        return True
+
+    def notified(self, stream_time: float, event: Optional[Event], delivered: bool) -> None:
+        """ Outcome of the notification of the detection of the given block, called by the notifier once known """
+        if event is not None:
+            event.notified = delivered
+        if delivered:
+            self.report_latency(stream_time)
+
+    def get_detection(self) -> Detection:
+        # Detections are compared across hosts, so their time is read from the wall clock (synchronized by NTP). The
+        # stream time follows the sample clock of the device, which drifts from it
+        detection_time = time.time()
+        if self.stream is not None and self.adc_clock:
+            detection_time -= self.stream.time - self.stream_time
+        return Detection(detection_time, self.confidence, self.rule)
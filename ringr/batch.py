@@ -0,0 +1,27 @@
+import time
+import queue
+
+from typing import Any, List, Optional, Tuple
+
+
+def next_batch(items: queue.Queue, size: int, latency: float,
+               idle_timeout: Optional[float] = None) -> Tuple[List[Any], bool]:
+    """
+    Wait for the next items of a queue closed with ``None``. Returns up to ``size`` items, taken at most ``latency``
+    seconds after the first one, and whether the queue was closed. While the queue is empty, waits at most
+    ``idle_timeout`` seconds, returning an empty batch.
+    """
+    batch: List[Any] = []
+    deadline = None
+    while len(batch) < size:
+        timeout = idle_timeout if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            item = items.get(timeout=timeout)
+        except queue.Empty:
+            break
+        if item is None:
+            return batch, True
+        batch.append(item)
+        if deadline is None:
+            deadline = time.monotonic() + latency
+    return batch, False
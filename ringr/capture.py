@@ -0,0 +1,286 @@
+import time
+import logging
+
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Optional, Tuple
+
+import numpy as np
+import sounddevice as sd
+
+from .config import DetectorConfig
+from .notifiers import Notifier
+from .recorder import FlightRecorder
+from .audio import AudioDetector
+from .exceptions import RingrDetectorError
+
+
+log = logging.getLogger('ringr')
+
+
+MAGIC = b'RGCR'
+VERSION = 2
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('samplerate', '<f8'),
+    ('blocksize', '<u4'),
+    ('channels', '<u4'),
+    ('dtype', 'S8'),
+    ('slots', '<u4'),
+    ('seq', '<u8'),  # sequence number of the last written block, starting at 1
+], align=True)
+
+
+def align(offset: int, alignment: int = 8) -> int:
+    """ Round up the offset to a multiple of the alignment """
+    return -(-offset // alignment) * alignment
+
+
+# The header takes a whole cache line. 8-byte values are only written atomically on aligned addresses (e.g. on 32-bit
+# ARM), as readers in other processes may read them at any time
+HEADER_SIZE = align(HEADER_DTYPE.itemsize, 64)
+
+
+class CaptureRing:
+    """
+    Ring buffer of audio blocks in shared memory, written by the capture daemon and read by detector processes.
+
+    The memory holds a header, the sequence number, ADC time and number of frames of each slot and the samples of the
+    slots. Block ``seq`` is written into slot ``seq % slots``. The writer clears the sequence number of the slot before
+    writing it and sets it once the block is complete, so readers detect blocks overwritten while they read them.
+    """
+
+    def __init__(self, shm: SharedMemory, owner: bool) -> None:
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((), HEADER_DTYPE, shm.buf)
+        if self.header['magic'] != MAGIC or self.header['version'] != VERSION:
+            raise RingrDetectorError(f'Invalid capture ring: {shm.name}')
+        self.samplerate = float(self.header['samplerate'])
+        self.blocksize = int(self.header['blocksize'])
+        self.channels = int(self.header['channels'])
+        self.dtype = self.header['dtype'].item().decode()
+        self.slots = int(self.header['slots'])
+
+        seq_offset, time_offset, frames_offset, data_offset, _ = self.layout(self.slots, self.blocksize, self.channels,
+                                                                             self.dtype)
+        self.slot_seq = np.ndarray((self.slots,), '<u8', shm.buf, seq_offset)
+        self.slot_time = np.ndarray((self.slots,), '<f8', shm.buf, time_offset)
+        self.slot_frames = np.ndarray((self.slots,), '<u4', shm.buf, frames_offset)
+        self.data = np.ndarray((self.slots, self.blocksize, self.channels), self.dtype, shm.buf, data_offset)
+
+    @staticmethod
+    def layout(slots: int, blocksize: int, channels: int, dtype: str) -> Tuple[int, int, int, int, int]:
+        """ Offsets of the sequence numbers, ADC times, number of frames and samples of the slots, and total size """
+        seq_offset = HEADER_SIZE
+        time_offset = align(seq_offset + slots * 8)
+        frames_offset = align(time_offset + slots * 8)
+        data_offset = align(frames_offset + slots * 4)
+        size = data_offset + slots * blocksize * channels * np.dtype(dtype).itemsize
+        return seq_offset, time_offset, frames_offset, data_offset, size
+
+    @classmethod
+    def size(cls, slots: int, blocksize: int, channels: int, dtype: str) -> int:
+        return cls.layout(slots, blocksize, channels, dtype)[-1]
+
+    @classmethod
+    def create(cls, name: str, samplerate: float, blocksize: int, channels: int, dtype: str,
+               slots: int) -> 'CaptureRing':
+        shm = SharedMemory(name, create=True, size=cls.size(slots, blocksize, channels, dtype))
+        header = np.ndarray((), HEADER_DTYPE, shm.buf)
+        header[()] = (MAGIC, VERSION, samplerate, blocksize, channels, dtype.encode(), slots, 0)
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'CaptureRing':
+        try:
+            shm = SharedMemory(name)
+        except FileNotFoundError:
+            raise RingrDetectorError(f'Capture ring not found: {name}. Is the capture daemon running?')
+        # Only the capture daemon removes the memory. Otherwise, the resource tracker of this process would remove it
+        # when the process exits (https://bugs.python.org/issue39959)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, owner=False)
+
+    @property
+    def seq(self) -> int:
+        return int(self.header['seq'])
+
+    def write(self, data: np.ndarray, frames: int, adc_time: float) -> None:
+        seq = self.seq + 1
+        slot = seq % self.slots
+        self.slot_seq[slot] = 0
+        self.data[slot, :frames] = data
+        self.slot_time[slot] = adc_time
+        self.slot_frames[slot] = frames
+        self.slot_seq[slot] = seq
+        self.header['seq'] = seq
+
+    def read(self, seq: int) -> Optional[Tuple[np.ndarray, int, float]]:
+        """ Block ``seq`` (a view of the shared memory, not a copy) or None if it was overwritten """
+        slot = seq % self.slots
+        if self.slot_seq[slot] != seq:
+            return None
+        frames = int(self.slot_frames[slot])
+        return self.data[slot, :frames], frames, float(self.slot_time[slot])
+
+    def valid(self, seq: int) -> bool:
+        """ Block ``seq`` has not been overwritten yet """
+        return self.slot_seq[seq % self.slots] == seq
+
+    def close(self) -> None:
+        # Views of the memory must be released before closing it
+        del self.header, self.slot_seq, self.slot_time, self.slot_frames, self.data
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class CaptureDaemon:
+    """ Owns the input device and writes its audio blocks into a capture ring shared with the detector processes """
+
+    def __init__(self, config: DetectorConfig, name: str, slots: int) -> None:
+        self.config = config
+        samplerate = AudioDetector.get_samplerate(config.device)
+        blocksize = int(samplerate * config.block_duration / 1000)
+        self.ring = CaptureRing.create(name, samplerate, blocksize, max(config.channels) + 1, config.dtype, slots)
+
+    def start(self) -> None:
+        log.info('Capturing into shared memory %s: %s slots of %s frames', self.ring.shm.name, self.ring.slots,
+                 self.ring.blocksize)
+        stream = sd.InputStream(
+            device=self.config.device,
+            channels=self.ring.channels,
+            samplerate=self.ring.samplerate,
+            blocksize=self.ring.blocksize,
+            dtype=self.ring.dtype,
+            latency='high' if self.config.latency is None else self.config.latency,
+            callback=self.callback
+        )
+        with stream:
+            while True:
+                time.sleep(1)
+
+    def callback(self, indata: np.ndarray, frames: int, stime: Any, status: sd.CallbackFlags) -> None:
+        if status:
+            log.error('Error status: %s', status)
+        self.ring.write(indata, frames, stime.inputBufferAdcTime)
+
+    def close(self) -> None:
+        self.ring.close()
+
+
+class RingAudioDetector(AudioDetector):
+    """
+    Audio detector that analyzes the blocks of a capture ring instead of opening the input device.
+
+    Blocks are analyzed in place in the shared memory. A consumer that falls more than the ring behind the capture
+    daemon skips to the latest block and the skipped blocks are reported as overruns. When the daemon stops writing
+    blocks for ``watchdog`` seconds, the detector attaches to the ring again, as the restarted daemon creates a new one.
+    """
+    poll_interval = 0.005
+
+    def __init__(self, config: DetectorConfig, notifier: Optional[Notifier], recorder: Optional[FlightRecorder],
+                 ring: CaptureRing) -> None:
+        self.ring = ring
+        self.next_seq = 0
+        self.lag = 0  # blocks behind the capture daemon
+        self.overruns = 0  # blocks lost by this consumer
+        super().__init__(config, notifier, recorder)
+        self.check_ring(ring)
+
+    def check_ring(self, ring: CaptureRing) -> None:
+        if ring.samplerate != self.samplerate:
+            raise RingrDetectorError(f'Samplerate of the capture ring is {ring.samplerate}')
+        if self.blocksize != ring.blocksize:
+            raise RingrDetectorError(f'Block size of the capture ring ({ring.blocksize}) does not match the detector '
+                                     f'one ({self.blocksize}). Use the same block_duration')
+        if max(self.channels) >= ring.channels:
+            raise RingrDetectorError(f'The capture ring only has {ring.channels} channels')
+        if self.dtype != ring.dtype:
+            raise RingrDetectorError(f'Sample format of the capture ring is {ring.dtype}')
+
+    def get_samplerate(self, device: Any) -> float:
+        return self.ring.samplerate
+
+    def get_device_name(self, device: Any) -> str:
+        return self.ring.shm.name
+
+    def start(self) -> None:
+        self.next_seq = self.ring.seq + 1
+        self.last_callback = time.monotonic()
+        while True:
+            if not self.read_blocks():
+                if self.watchdog and time.monotonic() - self.last_callback > self.watchdog:
+                    self.ring_stalled()
+                time.sleep(self.poll_interval)
+
+    def ring_stalled(self) -> None:
+        if self.available:
+            log.warning('No audio blocks from the capture daemon')
+            self.set_availability(False)
+        if self.backoff.ready():
+            # Until the blocks resume, in case the daemon is stalled instead of restarted
+            self.backoff.failed()
+            self.reattach()
+
+    def reattach(self) -> None:
+        """ Attach to the capture ring again. A restarted capture daemon creates a new ring with the same name """
+        name = self.ring.shm.name
+        try:
+            ring = CaptureRing.attach(name)
+        except RingrDetectorError as e:
+            log.debug('Unable to attach to the capture ring: %s', e)
+            return
+        try:
+            self.check_ring(ring)
+        except RingrDetectorError as e:
+            log.error('Capture ring %s changed: %s', name, e)
+            ring.close()
+            return
+        self.ring.close()
+        self.ring = ring
+        self.next_seq = ring.seq + 1
+        # The clock of the restarted daemon starts again
+        self.resync = True
+
+    def read_blocks(self) -> int:
+        """ Analyze the blocks written since the last call. Returns the number of blocks read """
+        last_seq = self.ring.seq
+        if last_seq < self.next_seq:
+            return 0
+        self.lag = last_seq - self.next_seq
+        if self.lag >= self.ring.slots - 1:
+            # The next block is being overwritten
+            self.lost_blocks(last_seq)
+        count = 0
+        while self.next_seq <= last_seq:
+            block = self.ring.read(self.next_seq)
+            if block is not None:
+                self.process_block(*block)
+            if block is None or not self.ring.valid(self.next_seq):
+                # Overwritten before or while it was analyzed
+                last_seq = self.ring.seq
+                self.lost_blocks(last_seq)
+                continue
+            self.next_seq += 1
+            count += 1
+        self.last_callback = time.monotonic()
+        if not self.available:
+            log.info('Audio blocks from the capture daemon resumed')
+            self.backoff.reset()
+            self.set_availability(True)
+        return count
+
+    def lost_blocks(self, last_seq: int) -> None:
+        """ Skip to the latest block """
+        count = last_seq - self.next_seq
+        self.overruns += count
+        # Keep the stream time of the following blocks without the ADC clock
+        self.frames += count * self.blocksize
+        log.warning('Analysis falling behind the capture daemon. %s blocks lost (%s in total)', count,
+                    self.overruns)
+        self.next_seq = last_seq
@@ -0,0 +1,128 @@
+import logging
+
+from pathlib import Path
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+
+from .wav import read_spectra
+from .exceptions import RingrDetectorError
+
+
+log = logging.getLogger('ringr')
+
+
+def hz_to_mel(frequency: np.ndarray) -> np.ndarray:
+    return 2595 * np.log10(1 + np.asarray(frequency) / 700)
+
+
+def mel_to_hz(mel: np.ndarray) -> np.ndarray:
+    return 700 * (10 ** (np.asarray(mel) / 2595) - 1)
+
+
+def mel_filterbank(samplerate: float, fftsize: int, num_mels: int, fmin: float = 0,
+                   fmax: float = None) -> np.ndarray:
+    """ Triangular mel filters applied to the bins of a FFT of ``fftsize`` samples. Shape: (num_mels, bins) """
+    fmax = samplerate / 2 if fmax is None else fmax
+    frequencies = np.fft.rfftfreq(fftsize, 1 / samplerate)
+    edges = mel_to_hz(np.linspace(hz_to_mel(fmin), hz_to_mel(fmax), num_mels + 2))
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (frequencies - lower) / (center - lower)
+    falling = (upper - frequencies) / (upper - center)
+    return np.maximum(0, np.minimum(rising, falling))
+
+
+def log_mel(spectra: np.ndarray, filterbank: np.ndarray) -> np.ndarray:
+    """ Log-mel energies of normalized magnitude spectra with the bins in the first axis """
+    return np.log10(filterbank @ np.square(spectra) + 1e-10)
+
+
+class SoundClassifier:
+    """
+    Logistic regression on the log-mel energies of a block.
+
+    The model is trained offline (``ringr train``) and stored as a NumPy ``.npz`` file. Its evaluation for each block is
+    a filterbank product and a dot product.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float, mean: np.ndarray, std: np.ndarray, samplerate: float,
+                 fftsize: int, fmin: float = 0, fmax: float = None) -> None:
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.std = std
+        self.samplerate = samplerate
+        self.fftsize = fftsize
+        self.fmin = fmin
+        self.fmax = samplerate / 2 if fmax is None else fmax
+        self.filterbank = mel_filterbank(samplerate, fftsize, len(weights), self.fmin, self.fmax)
+
+    @classmethod
+    def load(cls, file: Union[str, Path], samplerate: float, fftsize: int) -> 'SoundClassifier':
+        """ Load a model trained for blocks analyzed with the given samplerate and FFT size """
+        with np.load(file) as model:
+            classifier = cls(model['weights'], float(model['bias']), model['mean'], model['std'],
+                             float(model['samplerate']), int(model['fftsize']), float(model['fmin']),
+                             float(model['fmax']))
+        if classifier.samplerate != samplerate or classifier.fftsize != fftsize:
+            raise RingrDetectorError(f'Classifier trained for {classifier.samplerate} Hz and FFT size '
+                                     f'{classifier.fftsize}, the detector uses {samplerate} Hz and {fftsize}')
+        return classifier
+
+    def save(self, file: Union[str, Path]) -> None:
+        np.savez(file, weights=self.weights, bias=self.bias, mean=self.mean, std=self.std,
+                 samplerate=self.samplerate, fftsize=self.fftsize, fmin=self.fmin, fmax=self.fmax)
+
+    def features(self, spectra: np.ndarray) -> np.ndarray:
+        """ Standardized log-mel features of normalized magnitude spectra (bins, ...) """
+        return (log_mel(spectra, self.filterbank).T - self.mean) / self.std
+
+    def predict(self, spectra: np.ndarray) -> np.ndarray:
+        """ Probability of the sound of each normalized magnitude spectrum (bins, ...) """
+        return 1 / (1 + np.exp(-(self.features(spectra) @ self.weights + self.bias)))
+
+
+def train(positive: Sequence[Union[str, Path]], negative: Sequence[Union[str, Path]], samplerate: float,
+          fftsize: int, num_mels: int = 40, fmin: float = 0, fmax: float = None, epochs: int = 500,
+          learning_rate: float = 0.5, l2: float = 1e-3, silence_ratio: float = 0.1) -> Tuple[SoundClassifier, float]:
+    """
+    Train a classifier with the frames of labelled WAV files: clips of the sound (``positive``) and clips of any other
+    sound of the place (``negative``). Frames of the positive clips below ``silence_ratio`` of the loudest frame energy
+    are discarded. Returns the classifier and its accuracy on the training frames.
+    """
+    positive_spectra = [read_spectra(file, samplerate, fftsize) for file in positive]
+    for i, spectra in enumerate(positive_spectra):
+        energy = np.square(spectra).sum(axis=1)
+        positive_spectra[i] = spectra[energy >= energy.max() * silence_ratio]
+    negative_spectra = [read_spectra(file, samplerate, fftsize) for file in negative]
+    if not positive_spectra or not negative_spectra:
+        raise RingrDetectorError('Positive and negative clips are required')
+
+    spectra = np.concatenate(positive_spectra + negative_spectra)
+    labels = np.zeros(len(spectra))
+    labels[:sum(len(s) for s in positive_spectra)] = 1
+
+    classifier = SoundClassifier(np.zeros(num_mels), 0, np.zeros(num_mels), np.ones(num_mels), samplerate, fftsize,
+                                 fmin, fmax)
+    features = log_mel(spectra.T, classifier.filterbank).T
+    classifier.mean = features.mean(axis=0)
+    classifier.std = np.maximum(features.std(axis=0), 1e-6)
+    features = (features - classifier.mean) / classifier.std
+
+    # Both classes weigh the same, whatever the number of frames of each one
+    sample_weights = np.where(labels == 1, 0.5 / labels.sum(), 0.5 / (len(labels) - labels.sum()))
+
+    # Batch gradient descent of the weighted cross-entropy
+    weights = np.zeros(num_mels)
+    bias = 0.0
+    for _ in range(epochs):
+        error = (1 / (1 + np.exp(-(features @ weights + bias))) - labels) * sample_weights
+        weights -= learning_rate * (features.T @ error + l2 * weights)
+        bias -= learning_rate * error.sum()
+    classifier.weights = weights
+    classifier.bias = bias
+
+    accuracy = float(((features @ weights + bias > 0) == labels).mean())
+    log.info('Classifier trained with %s positive and %s negative frames. Accuracy: %.3f', int(labels.sum()),
+             int(len(labels) - labels.sum()), accuracy)
+    return classifier, accuracy
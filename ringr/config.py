@@ -3,7 +3,7 @@ from pathlib import Path
 import logging
 
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Tuple, Union
 
 from .config_parser import EnvConfigParser
 from .notifiers import parse_notifier_config, NotifierConfig
@@ -12,9 +12,31 @@ from .notifiers import parse_notifier_config, NotifierConfig
 log = logging.getLogger('ringr')
 
 
+def parse_device(value: str) -> Union[int, str]:
+    """ Input device by index or by name """
+    return int(value) if value.isdigit() else value
+
+
+def parse_int_list(value: Optional[str], fallback: Tuple[int, ...]) -> Tuple[int, ...]:
+    if not value:
+        return fallback
+    return tuple(int(item) for item in value.split(','))
+
+
+def parse_tone_list(value: Optional[str]) -> Tuple[Tuple[int, float], ...]:
+    """ Parse a comma-separated list of tones with the format frequency:duration """
+    if not value:
+        return ()
+    tones = []
+    for item in value.split(','):
+        frequency, duration = item.split(':')
+        tones.append((int(frequency), float(duration)))
+    return tuple(tones)
+
+
 @dataclass(frozen=True)
 class DetectorConfig:
-    device: int
+    device: Union[int, str]
     threshold: float
     peak_duration: float
     frequency: int
@@ -25,14 +47,29 @@ class DetectorConfig:
     cooldown_secs: float = 10
     block_duration: int = 50
     log_analysis: bool = False
+    channels: Tuple[int, ...] = (0,)
+    channel_policy: str = 'max'
+    channel_votes: int = 1
+    dtype: str = 'float32'
+    runtime: str = 'thread'
+    mode: str = 'frequency'
+    template: Optional[str] = None
+    sequence: Tuple[Tuple[int, float], ...] = ()
+    sequence_gap: float = 0.5
+    sequence_tolerance: float = 0.5
+    feature_bands: int = 64
+    watchdog: Optional[float] = None  # by default, derived from the block duration and the latency
+    source: str = 'device'
+    classifier: Optional[str] = None
+    classifier_threshold: float = 0.5
 
     @classmethod
     def configure(cls, conf: EnvConfigParser):
         return cls(
-            device=conf.getint('detector', 'device'),
-            threshold=conf.getfloat('detector', 'threshold'),
-            peak_duration=conf.getfloat('detector', 'peak_duration'),
-            frequency=conf.getint('detector', 'frequency'),
+            device=parse_device(conf.get('detector', 'device')),
+            threshold=conf.getfloat('detector', 'threshold', fallback=0),
+            peak_duration=conf.getfloat('detector', 'peak_duration', fallback=0),
+            frequency=conf.getint('detector', 'frequency', fallback=0),
             num_freq_bins=conf.getint('detector', 'frequency_bins', fallback=cls.num_freq_bins),
             acceptance_ratio=conf.getfloat('detector', 'acceptance_ratio', fallback=cls.acceptance_ratio),
             gain=conf.getint('detector', 'gain', fallback=cls.gain),
@@ -40,23 +77,136 @@ class DetectorConfig:
             cooldown_secs=conf.getfloat('detector', 'cooldown', fallback=cls.cooldown_secs),
             block_duration=conf.getint('detector', 'block_duration', fallback=cls.block_duration),
             log_analysis=conf.getboolean('detector', 'log_analysis', fallback=cls.log_analysis),
+            channels=parse_int_list(conf.get('detector', 'channels', fallback=None), fallback=cls.channels),
+            channel_policy=conf.get('detector', 'channel_policy', fallback=cls.channel_policy),
+            channel_votes=conf.getint('detector', 'channel_votes', fallback=cls.channel_votes),
+            dtype=conf.get('detector', 'dtype', fallback=cls.dtype),
+            runtime=conf.get('detector', 'runtime', fallback=cls.runtime),
+            mode=conf.get('detector', 'mode', fallback=cls.mode),
+            template=conf.get('detector', 'template', fallback=cls.template),
+            sequence=parse_tone_list(conf.get('detector', 'sequence', fallback=None)),
+            sequence_gap=conf.getfloat('detector', 'sequence_gap', fallback=cls.sequence_gap),
+            sequence_tolerance=conf.getfloat('detector', 'sequence_tolerance', fallback=cls.sequence_tolerance),
+            feature_bands=conf.getint('detector', 'feature_bands', fallback=cls.feature_bands),
+            watchdog=conf.getfloat('detector', 'watchdog', fallback=cls.watchdog),
+            source=conf.get('detector', 'source', fallback=cls.source),
+            classifier=conf.get('detector', 'classifier', fallback=cls.classifier),
+            classifier_threshold=conf.getfloat('detector', 'classifier_threshold', fallback=cls.classifier_threshold),
+        )
+
+
+@dataclass(frozen=True)
+class RecorderConfig:
+    path: Optional[str] = None
+    segment_size: int = 72000
+    max_segments: int = 24
+
+    @classmethod
+    def configure(cls, conf: EnvConfigParser):
+        return cls(
+            path=conf.get('recorder', 'path', fallback=cls.path),
+            segment_size=conf.getint('recorder', 'segment_size', fallback=cls.segment_size),
+            max_segments=conf.getint('recorder', 'max_segments', fallback=cls.max_segments),
+        )
+
+
+@dataclass(frozen=True)
+class MonitorConfig:
+    port: Optional[int] = None
+    host: str = '127.0.0.1'
+    fps: float = 10
+    bins: int = 128
+
+    @classmethod
+    def configure(cls, conf: EnvConfigParser):
+        return cls(
+            port=conf.getint('monitor', 'port', fallback=cls.port),
+            host=conf.get('monitor', 'host', fallback=cls.host),
+            fps=conf.getfloat('monitor', 'fps', fallback=cls.fps),
+            bins=conf.getint('monitor', 'bins', fallback=cls.bins),
+        )
+
+
+@dataclass(frozen=True)
+class EdgeConfig:
+    transport: str = 'udp'
+    host: str = '127.0.0.1'
+    port: int = 9977
+    topic: str = 'ringr/features'
+    node_id: str = 'ringr_01'
+    mqtt_user: Optional[str] = None
+    mqtt_pass: Optional[str] = None
+
+    @classmethod
+    def configure(cls, conf: EnvConfigParser):
+        return cls(
+            transport=conf.get('edge', 'transport', fallback=cls.transport),
+            host=conf.get('edge', 'host', fallback=cls.host),
+            port=conf.getint('edge', 'port', fallback=cls.port),
+            topic=conf.get('edge', 'topic', fallback=cls.topic),
+            node_id=conf.get('edge', 'node_id', fallback=cls.node_id),
+            mqtt_user=conf.get('edge', 'mqtt_user', fallback=cls.mqtt_user),
+            mqtt_pass=conf.get('edge', 'mqtt_pass', fallback=cls.mqtt_pass),
+        )
+
+
+@dataclass(frozen=True)
+class CaptureConfig:
+    name: str = 'ringr_capture'
+    slots: int = 64
+
+    @classmethod
+    def configure(cls, conf: EnvConfigParser):
+        return cls(
+            name=conf.get('capture', 'name', fallback=cls.name),
+            slots=conf.getint('capture', 'slots', fallback=cls.slots),
+        )
+
+
+@dataclass(frozen=True)
+class EventsConfig:
+    path: Optional[str] = None
+    retention_days: float = 90
+
+    @classmethod
+    def configure(cls, conf: EnvConfigParser):
+        return cls(
+            path=conf.get('events', 'path', fallback=cls.path),
+            retention_days=conf.getfloat('events', 'retention_days', fallback=cls.retention_days),
         )
 
 
 @dataclass(frozen=True)
 class Config:
     detector: DetectorConfig
-    notifier: NotifierConfig
+    notifier: Optional[NotifierConfig]
+    recorder: RecorderConfig
+    monitor: MonitorConfig
+    edge: EdgeConfig
+    capture: CaptureConfig
+    events: EventsConfig
 
 
-def load_config(file: Path) -> Config:
+def read_config_file(file: Path) -> EnvConfigParser:
     parser = EnvConfigParser()
     if os.path.isfile(file):
         parser.read(file)
+    return parser
+
+
+def load_config(file: Path) -> Config:
+    parser = read_config_file(file)
 
-    notifier_config = parse_notifier_config(parser)
     detector_config = DetectorConfig.configure(parser)
-    config = Config(detector_config, notifier_config)
+    # Edge detectors do not notify, detection runs in the aggregator
+    notifier_config = None if detector_config.mode == 'features' else parse_notifier_config(parser)
+    recorder_config = RecorderConfig.configure(parser)
+    monitor_config = MonitorConfig.configure(parser)
+    edge_config = EdgeConfig.configure(parser)
+    capture_config = CaptureConfig.configure(parser)
+    events_config = EventsConfig.configure(parser)
+    config = Config(detector_config, notifier_config, recorder_config, monitor_config, edge_config, capture_config,
+                    events_config)
 
     log.debug('Config used: %s', config)
     return config
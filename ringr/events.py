@@ -0,0 +1,132 @@
+import time
+import queue
+import sqlite3
+import logging
+import threading
+
+from dataclasses import dataclass, astuple
+from pathlib import Path
+from typing import List, Optional, Union
+
+from .batch import next_batch
+
+
+log = logging.getLogger('ringr')
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    start REAL NOT NULL,  -- wall-clock time in seconds since the epoch
+    end REAL,
+    stream_start REAL NOT NULL,  -- stream time of the detector
+    stream_end REAL,
+    rule TEXT NOT NULL,
+    peak_magnitude REAL,
+    hit_ratio REAL,  -- NULL if the rule has no sliding window
+    notified INTEGER  -- NULL if unknown
+);
+CREATE INDEX IF NOT EXISTS events_start ON events (start);
+'''
+
+
+@dataclass
+class Event:
+    """ Sound event, from its detection until the end of its cooldown """
+    start: float
+    stream_start: float
+    rule: str
+    peak_magnitude: float
+    hit_ratio: Optional[float]  # None if the rule has no sliding window
+    notified: Optional[bool] = None
+    end: Optional[float] = None
+    stream_end: Optional[float] = None
+
+
+class EventStore:
+    """
+    History of the detected events in a SQLite database.
+
+    Events are written by a background thread, so the detector never waits for the disk. Events are inserted in batches
+    of up to ``batch_size`` events per transaction, at most ``flush_interval`` seconds after they are added. Events
+    older than ``retention_days`` are removed once per hour.
+    """
+    prune_interval = 3600
+
+    def __init__(self, path: Union[str, Path], retention_days: float = 90, batch_size: int = 100,
+                 flush_interval: float = 1.0) -> None:
+        self.path = Path(path)
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: queue.Queue = queue.Queue()
+        self.last_prune = 0.0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='ringr-events', daemon=True)
+        self._thread.start()
+
+    def add(self, event: Event) -> None:
+        self.queue.put(event)
+
+    def close(self) -> None:
+        """ Write the pending events and stop the writer """
+        self.queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        db = sqlite3.connect(self.path)
+        try:
+            # Readers (e.g. ringr events) don't block the writer
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(SCHEMA)
+            stopped = False
+            while not stopped:
+                # While idle, wake up for the periodic pruning
+                batch, stopped = next_batch(self.queue, self.batch_size, self.flush_interval,
+                                            idle_timeout=self.prune_interval)
+                if batch:
+                    self._write(db, batch)
+                if time.time() - self.last_prune > self.prune_interval:
+                    self._prune(db)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _write(db: sqlite3.Connection, batch: List[Event]) -> None:
+        try:
+            with db:
+                db.executemany('INSERT INTO events (start, stream_start, rule, peak_magnitude, hit_ratio, notified, '
+                               'end, stream_end) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               [astuple(event) for event in batch])
+            log.debug('%s events stored', len(batch))
+        except sqlite3.Error:
+            log.error('Unable to store %s events', len(batch), exc_info=True)
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        self.last_prune = time.time()
+        try:
+            with db:
+                cursor = db.execute('DELETE FROM events WHERE start < ?',
+                                    (self.last_prune - self.retention_days * 86400,))
+            if cursor.rowcount:
+                log.info('%s events older than %s days removed', cursor.rowcount, self.retention_days)
+        except sqlite3.Error:
+            log.error('Unable to remove old events', exc_info=True)
+
+
+def query_events(path: Union[str, Path], start: Optional[float] = None, end: Optional[float] = None,
+                 rule: Optional[str] = None) -> List[sqlite3.Row]:
+    """ Events started in the time range [start, end), optionally of a single rule, in chronological order """
+    db = sqlite3.connect(f'{Path(path).absolute().as_uri()}?mode=ro', uri=True)
+    db.row_factory = sqlite3.Row
+    try:
+        conditions = ['start >= ?', 'start < ?']
+        params = [start if start is not None else float('-inf'), end if end is not None else float('inf')]
+        if rule is not None:
+            conditions.append('rule = ?')
+            params.append(rule)
+        return db.execute(f'SELECT * FROM events WHERE {" AND ".join(conditions)} ORDER BY start', params).fetchall()
+    finally:
+        db.close()
@@ -0,0 +1,192 @@
+import socket
+import struct
+import logging
+import threading
+
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Optional
+
+import numpy as np
+import paho.mqtt.client as paho
+
+from .exceptions import RingrDetectorError
+
+
+log = logging.getLogger('ringr')
+
+
+# magic, version, node id length, block number, stream time, samplerate, fftsize, number of bands
+HEADER = struct.Struct('!2sBBIdIHH')
+MAGIC = b'RG'
+VERSION = 1
+
+
+@dataclass(frozen=True)
+class FeatureFrame:
+    """ Compact features of a block: magnitude of each frequency band quantized to uint8 """
+    node_id: str
+    block: int
+    stream_time: float
+    samplerate: int
+    fftsize: int
+    bands: np.ndarray
+
+
+def downsample(spectrum: np.ndarray, num_bands: int) -> np.ndarray:
+    """ Reduce a spectrum to ``num_bands`` bands keeping the peak of each group of consecutive bins """
+    group = -(-len(spectrum) // num_bands)
+    return np.pad(spectrum, (0, group * num_bands - len(spectrum))).reshape(num_bands, group).max(axis=1)
+
+
+def quantize(values: np.ndarray) -> np.ndarray:
+    """ Quantize values in [0, 1] to uint8 """
+    return (np.clip(values, 0, 1) * 255).astype(np.uint8)
+
+
+def band_index(frequency: float, samplerate: float, fftsize: int, num_bands: int) -> int:
+    """ Band containing the frequency bin analyzed by the detector for the given frequency """
+    num_bins = fftsize // 2 + 1
+    delta_f = samplerate / 2 / (num_bins - 1)
+    return min(int(np.ceil(frequency / delta_f)) // -(-num_bins // num_bands), num_bands - 1)
+
+
+def encode_frame(frame: FeatureFrame) -> bytes:
+    node_id = frame.node_id.encode()
+    header = HEADER.pack(MAGIC, VERSION, len(node_id), frame.block % 2 ** 32, frame.stream_time,
+                         int(frame.samplerate), frame.fftsize, len(frame.bands))
+    return header + node_id + frame.bands.tobytes()
+
+
+def decode_frame(packet: bytes) -> FeatureFrame:
+    try:
+        magic, version, id_length, block, stream_time, samplerate, fftsize, num_bands = HEADER.unpack_from(packet)
+    except struct.error:
+        raise RingrDetectorError('Invalid feature frame')
+    if magic != MAGIC or version != VERSION or len(packet) != HEADER.size + id_length + num_bands:
+        raise RingrDetectorError('Invalid feature frame')
+    if samplerate <= 0 or fftsize < 2 or num_bands <= 0:
+        raise RingrDetectorError('Invalid feature layout')
+    try:
+        node_id = packet[HEADER.size:HEADER.size + id_length].decode()
+    except UnicodeDecodeError:
+        raise RingrDetectorError('Invalid feature frame node id')
+    bands = np.frombuffer(packet, dtype=np.uint8, offset=HEADER.size + id_length)
+    return FeatureFrame(node_id, block, stream_time, samplerate, fftsize, bands)
+
+
+class FeaturePublisher(ABC):
+    """ Publishes the features of each block of an edge detector """
+
+    def __init__(self, node_id: str, samplerate: float, fftsize: int) -> None:
+        self.node_id = node_id
+        self.samplerate = samplerate
+        self.fftsize = fftsize
+
+    def publish(self, block: int, stream_time: float, bands: np.ndarray) -> None:
+        frame = FeatureFrame(self.node_id, block, stream_time, self.samplerate, self.fftsize, quantize(bands))
+        self.send(encode_frame(frame))
+
+    @abstractmethod
+    def send(self, packet: bytes) -> None:
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        pass
+
+
+class UDPFeaturePublisher(FeaturePublisher):
+    def __init__(self, host: str, port: int, *args) -> None:
+        super().__init__(*args)
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def send(self, packet: bytes) -> None:
+        try:
+            self.socket.sendto(packet, self.address)
+        except OSError as e:
+            log.debug('Unable to send feature frame: %s', e)
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+class MQTTFeaturePublisher(FeaturePublisher):
+    def __init__(self, host: str, port: int, topic: str, user: Optional[str], password: Optional[str],
+                 *args) -> None:
+        super().__init__(*args)
+        self.topic = f'{topic}/{self.node_id}'
+        self.mqtt = paho.Client(client_id=f'{self.node_id}_features')
+        if user and password:
+            self.mqtt.username_pw_set(username=user, password=password)
+        self.mqtt.connect(host=host, port=port)
+        self.mqtt.loop_start()
+
+    def send(self, packet: bytes) -> None:
+        # QoS 0: a lost frame is replaced by the next one 50 ms later
+        self.mqtt.publish(self.topic, payload=packet, qos=0)
+
+    def close(self) -> None:
+        self.mqtt.loop_stop()
+        self.mqtt.disconnect()
+
+
+class FeatureReceiver(ABC):
+    """ Receives feature frames from many edge detectors into a queue drained by the aggregator """
+
+    def __init__(self) -> None:
+        self.packets: Deque[bytes] = deque()
+
+    @abstractmethod
+    def start(self) -> None:
+        raise NotImplementedError()
+
+    def drain(self) -> list:
+        packets = []
+        while self.packets:
+            packets.append(self.packets.popleft())
+        return packets
+
+
+class UDPFeatureReceiver(FeatureReceiver):
+    def __init__(self, host: str, port: int) -> None:
+        super().__init__()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+
+    def start(self) -> None:
+        threading.Thread(target=self._receive, name='ringr-features', daemon=True).start()
+
+    def _receive(self) -> None:
+        while True:
+            packet, _ = self.socket.recvfrom(65535)
+            self.packets.append(packet)
+
+
+class MQTTFeatureReceiver(FeatureReceiver):
+    def __init__(self, host: str, port: int, topic: str, user: Optional[str], password: Optional[str],
+                 client_id: str) -> None:
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.topic = f'{topic}/+'
+        self.mqtt = paho.Client(client_id=client_id)
+        if user and password:
+            self.mqtt.username_pw_set(username=user, password=password)
+        self.mqtt.on_connect = self._on_mqtt_connect
+        self.mqtt.on_message = self._on_mqtt_message
+
+    def start(self) -> None:
+        self.mqtt.connect(host=self.host, port=self.port)
+        self.mqtt.loop_start()
+
+    def _on_mqtt_connect(self, client, userdata, flags, rc):
+        if rc == paho.CONNACK_ACCEPTED:
+            self.mqtt.subscribe(self.topic)
+        else:
+            log.error('MQTT connection error. Code: %s', rc)
+
+    def _on_mqtt_message(self, client, userdata, msg):
+        self.packets.append(msg.payload)
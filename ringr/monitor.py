@@ -0,0 +1,258 @@
+import json
+import base64
+import hashlib
+import asyncio
+import logging
+import threading
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .features import downsample, quantize
+
+log = logging.getLogger('ringr')
+
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+INDEX_PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>ringr monitor</title>
+<style>
+  body { background: #111; color: #ddd; font-family: sans-serif; margin: 1em; }
+  canvas { width: 100%; height: 70vh; background: #000; }
+</style>
+</head>
+<body>
+<div id="info">Connecting...</div>
+<canvas id="spectrum"></canvas>
+<script>
+const canvas = document.getElementById('spectrum');
+const ctx = canvas.getContext('2d');
+const info = document.getElementById('info');
+let meta = null;
+const ws = new WebSocket(`ws://${location.host}/ws`);
+ws.binaryType = 'arraybuffer';
+ws.onclose = () => { info.textContent = 'Disconnected'; };
+ws.onmessage = (event) => {
+  if (typeof event.data === 'string') {
+    meta = JSON.parse(event.data);
+    info.textContent = `${meta.mode} mode - ${meta.samplerate} Hz - ${meta.fps} fps`;
+    return;
+  }
+  const frame = new Uint8Array(event.data);
+  const numValues = frame[0], threshold = frame[1];
+  const values = frame.subarray(2, 2 + numValues), spectrum = frame.subarray(2 + numValues);
+  canvas.width = canvas.clientWidth;
+  canvas.height = canvas.clientHeight;
+  const w = canvas.width, h = canvas.height * 0.8, barWidth = w / spectrum.length;
+  ctx.clearRect(0, 0, w, canvas.height);
+  ctx.fillStyle = '#3a8';
+  spectrum.forEach((v, i) => ctx.fillRect(i * barWidth, h - v / 255 * h, Math.max(1, barWidth - 1), v / 255 * h));
+  const ruleWidth = w / numValues;
+  values.forEach((v, i) => {
+    ctx.fillStyle = v > threshold ? '#e55' : '#58e';
+    ctx.fillRect(i * ruleWidth, canvas.height - v / 255 * (canvas.height - h), ruleWidth - 2, canvas.height);
+  });
+  ctx.fillStyle = '#fff';
+  ctx.fillRect(0, canvas.height - threshold / 255 * (canvas.height - h), w, 1);
+};
+</script>
+</body>
+</html>
+'''
+
+
+def websocket_frame(payload: bytes, opcode: int = OPCODE_BINARY) -> bytes:
+    """ Unmasked (server to client) WebSocket frame """
+    length = len(payload)
+    if length < 126:
+        header = bytes([0x80 | opcode, length])
+    elif length < 2 ** 16:
+        header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, 'big')
+    else:
+        header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, 'big')
+    return header + payload
+
+
+def websocket_accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+
+
+class MonitorClient:
+    """ Connected browser. Only the latest frame is kept, older ones are dropped if the client is slow """
+
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.frame: Optional[bytes] = None
+        self.ready = asyncio.Event()
+
+    def push(self, frame: bytes) -> None:
+        self.frame = frame
+        self.ready.set()
+
+    async def send(self) -> None:
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                self.writer.write(websocket_frame(self.frame))
+                await self.writer.drain()
+        except ConnectionError:
+            pass
+
+
+class SpectrumMonitor:
+    """
+    Local HTTP/WebSocket server that streams the spectrum and the rule magnitudes of the detector to a browser.
+
+    Frames are decimated to ``fps`` frames per second, downsampled to ``num_bins`` bins and quantized to uint8. The
+    server runs its own event loop in a separate thread, so slow or stalled clients never block the detector.
+    """
+
+    def __init__(self, host: str, port: int, fps: float, num_bins: int, block_rate: float, scale: float,
+                 info: dict) -> None:
+        self.host = host
+        self.port = port
+        self.fps = fps
+        self.num_bins = num_bins
+        self.every = max(1, round(block_rate / fps))
+        self.scale = scale
+        self.info = info
+        self.blocks = 0
+        self.clients = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._started = threading.Event()
+        self._error: Optional[Exception] = None  # raised while starting the server
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='ringr-monitor', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._error is not None:
+            # e.g. the port is already in use
+            self._thread.join()
+            self._thread = None
+            raise self._error
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def publish(self, magnitudes: np.ndarray, values: Sequence[float], threshold: float) -> None:
+        """ Called from the detector for each block with the magnitude spectrum (bins, channels) """
+        self.blocks += 1
+        if self.blocks % self.every or not self.clients:
+            return
+        frame = self.encode(magnitudes, values, threshold)
+        self.loop.call_soon_threadsafe(self._broadcast, frame)
+
+    def encode(self, magnitudes: np.ndarray, values: Sequence[float], threshold: float) -> bytes:
+        spectrum = downsample(magnitudes.max(axis=1) * self.scale, self.num_bins)
+        values = np.atleast_1d(values)
+        header = np.array([len(values), threshold * 255], dtype=np.uint8)
+        return b''.join([header.tobytes(), quantize(values).tobytes(), quantize(spectrum).tobytes()])
+
+    def _broadcast(self, frame: bytes) -> None:
+        for client in self.clients:
+            client.push(frame)
+
+    def _run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        except Exception as e:
+            self._error = e
+            self.loop.close()
+            self._started.set()
+            return
+        self.port = self.server.sockets[0].getsockname()[1]
+        log.info('Spectrum monitor listening on http://%s:%s', self.host, self.port)
+        self._started.set()
+        self.loop.run_forever()
+
+        # Close the connections of the clients
+        self.server.close()
+        tasks = asyncio.all_tasks(self.loop)
+        for task in tasks:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self.loop.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+            lines = request.decode('latin-1').split('\r\n')
+            method, path, _ = lines[0].split(' ', 2)
+            headers = dict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+            headers = {key.lower(): value for key, value in headers.items()}
+
+            if path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._handle_websocket(reader, writer, headers['sec-websocket-key'])
+            elif path == '/':
+                self._respond(writer, '200 OK', 'text/html; charset=utf-8', INDEX_PAGE.encode())
+            else:
+                self._respond(writer, '404 Not Found', 'text/plain', b'Not found')
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError, KeyError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _respond(writer: asyncio.StreamWriter, status: str, content_type: str, body: bytes) -> None:
+        writer.write(f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n'
+                     f'Connection: close\r\n\r\n'.encode() + body)
+
+    async def _handle_websocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, key: str) -> None:
+        # Registered before the handshake is sent, so the frames published once the client has the info are streamed.
+        # The sender only runs after this step, so the handshake goes first
+        client = MonitorClient(writer)
+        sender = asyncio.ensure_future(client.send())
+        self.clients.add(client)
+        writer.write(f'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     f'Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n'.encode())
+        writer.write(websocket_frame(json.dumps(dict(self.info, fps=self.fps)).encode(), OPCODE_TEXT))
+        log.debug('Spectrum monitor client connected')
+        try:
+            await self._receive(reader, writer)
+        finally:
+            self.clients.discard(client)
+            sender.cancel()
+            log.debug('Spectrum monitor client disconnected')
+
+    @staticmethod
+    async def _receive(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """ Read (and discard) the messages from the client until it closes the connection """
+        while True:
+            head = await reader.readexactly(2)
+            opcode = head[0] & 0x0F
+            length = head[1] & 0x7F
+            if length == 126:
+                length = int.from_bytes(await reader.readexactly(2), 'big')
+            elif length == 127:
+                length = int.from_bytes(await reader.readexactly(8), 'big')
+            mask = await reader.readexactly(4) if head[1] & 0x80 else b''
+            payload = await reader.readexactly(length)
+            if mask:
+                payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+            if opcode == OPCODE_CLOSE:
+                writer.write(websocket_frame(b'', OPCODE_CLOSE))
+                return
+            if opcode == OPCODE_PING:
+                writer.write(websocket_frame(payload, OPCODE_PONG))
@@ -2,9 +2,10 @@ import os
 
 from typing import cast
 
-from ringr.notifiers.notifier import Notifier, NotifierConfig
+from ringr.notifiers.notifier import Detection, Notifier, NotifierConfig, Outcome
 from ringr.notifiers.ha_notifier import HANotifier, HANotifierConfig
 from ringr.notifiers.telegram_notifier import TelegramNotifier, TelegramNotifierConfig
+from ringr.notifiers.webhook_notifier import WebhookNotifier, WebhookNotifierConfig
 from ringr.config_parser import EnvConfigParser
 from ringr.exceptions import RingrDetectorError
 
@@ -12,9 +13,10 @@ from ringr.exceptions import RingrDetectorError
 __all__ = [
     'create_notifier',
     'parse_notifier_config',
-    'Notifier', 'NotifierConfig',
+    'Detection', 'Notifier', 'NotifierConfig', 'Outcome',
     'HANotifier', 'HANotifierConfig',
-    'TelegramNotifier', 'TelegramNotifierConfig'
+    'TelegramNotifier', 'TelegramNotifierConfig',
+    'WebhookNotifier', 'WebhookNotifierConfig'
 ]
 
 
@@ -24,6 +26,8 @@ def parse_notifier_config(config: EnvConfigParser):
         return HANotifierConfig.configure(config)
     elif notifier_type == 'telegram':
         return TelegramNotifierConfig.configure(config)
+    elif notifier_type == 'webhook':
+        return WebhookNotifierConfig.configure(config)
     else:
         raise RingrDetectorError(f'Unsupported notifier: {config.type}')
 
@@ -33,6 +37,8 @@ def create_notifier(config: NotifierConfig) -> Notifier:
         return HANotifier(cast(HANotifierConfig, config))
     elif config.type == 'telegram':
         return TelegramNotifier(cast(TelegramNotifierConfig, config))
+    elif config.type == 'webhook':
+        return WebhookNotifier(cast(WebhookNotifierConfig, config))
     else:
         raise RingrDetectorError(f'Unsupported notifier: {config.type}')
 
@@ -0,0 +1,96 @@
+import json
+import time
+import logging
+import threading
+
+from typing import Callable, List, Optional, Tuple
+
+import paho.mqtt.client as paho
+
+from ringr.notifiers.notifier import Detection
+
+
+log = logging.getLogger('ringr')
+
+
+# node id, wall-clock time, confidence
+Candidate = Tuple[str, float, float]
+
+
+class Election:
+    """
+    Picks a single node to notify a sound event heard by several ringr instances.
+
+    When a node detects an event, it publishes its candidate (detection time and confidence) to a topic shared by the
+    group and waits ``window`` seconds for the candidates of the other nodes. An event groups the candidates detected
+    within half the window after its earliest one, the other half is left for their delivery. Every node then applies
+    the same rule to the same candidates: the highest confidence wins, then the earliest detection, then the lowest
+    node id. Detection times are wall-clock times, so the clocks of the nodes must be synchronized (e.g. NTP).
+    """
+
+    def __init__(self, mqtt: paho.Client, topic: str, node_id: str, window: float, qos: int) -> None:
+        self.mqtt = mqtt
+        self.topic = topic
+        self.node_id = node_id
+        self.window = window
+        self.qos = qos
+        self.received: List[Candidate] = []  # recent candidates of the other nodes
+        self.timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def run(self, detection: Detection, callback: Callable[[bool], None]) -> None:
+        """ Publish the candidate of this node. ``callback`` is called with the result once the window is closed """
+        self.cancel()
+        payload = {'node': self.node_id, 'time': detection.time, 'confidence': detection.confidence}
+        self.mqtt.publish(self.topic, payload=json.dumps(payload), qos=self.qos)
+        self.timer = threading.Timer(self.window, self._close, [(self.node_id, detection.time, detection.confidence),
+                                                                callback])
+        self.timer.daemon = True
+        self.timer.start()
+
+    def cancel(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def receive(self, payload: bytes) -> None:
+        try:
+            message = json.loads(payload)
+            candidate = (str(message['node']), float(message['time']), float(message['confidence']))
+        except (ValueError, KeyError, TypeError):
+            log.debug('Discarded invalid election candidate: %s', payload)
+            return
+        if candidate[0] == self.node_id:
+            return
+        with self._lock:
+            # Older candidates can't belong to an ongoing election
+            horizon = time.time() - 10 * self.window
+            self.received = [c for c in self.received if c[1] > horizon] + [candidate]
+
+    def _close(self, own: Candidate, callback: Callable[[bool], None]) -> None:
+        with self._lock:
+            candidates = self.group(self.received + [own], own, self.window / 2)
+        winner = self.winner(candidates)
+        log.debug('Election among %s candidates won by %s', len(candidates), winner[0])
+        callback(winner == own)
+
+    @staticmethod
+    def group(candidates: List[Candidate], own: Candidate, span: float) -> List[Candidate]:
+        """
+        Candidates of the event of ``own``. Each event starts at the earliest candidate after the previous event and
+        spans ``span`` seconds, so all the nodes split the same candidates into the same events
+        """
+        start = None
+        group: List[Candidate] = []
+        for candidate in sorted(candidates, key=lambda c: (c[1], c[0])):
+            if start is None or candidate[1] - start > span:
+                if own in group:
+                    break
+                start = candidate[1]
+                group = []
+            group.append(candidate)
+        return group
+
+    @staticmethod
+    def winner(candidates: List[Candidate]) -> Candidate:
+        return min(candidates, key=lambda c: (-c[2], c[1], c[0]))
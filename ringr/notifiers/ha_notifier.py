@@ -1,14 +1,18 @@
 import json
+import time
 import logging
 import threading
 
+from collections import deque
 from dataclasses import dataclass
-from typing import Union, Optional
+from functools import partial
+from typing import Deque, Dict, Optional, Union
 
 import paho.mqtt.client as paho
 
 from ringr import __title__, __version__, __author__
-from ringr.notifiers.notifier import Notifier, NotifierConfig
+from ringr.notifiers.notifier import Detection, Notifier, NotifierConfig, Outcome
+from ringr.notifiers.election import Election
 from ringr.config_parser import EnvConfigParser
 
 
@@ -25,6 +29,8 @@ class HANotifierConfig(NotifierConfig):
     mqtt_qos: int = 1
     device_id: str = 'ringr_01'
     device_name: str = 'ringr 01'
+    dedup_group: Optional[str] = None
+    dedup_window: float = 0.3
 
     @classmethod
     def configure(cls, conf: EnvConfigParser):
@@ -38,6 +44,8 @@ class HANotifierConfig(NotifierConfig):
             mqtt_pass=conf.get('notifier', 'mqtt_pass', fallback=cls.mqtt_pass),
             mqtt_client_id=conf.get('notifier', 'mqtt_client_id', fallback=cls.mqtt_client_id),
             mqtt_qos=conf.getint('notifier', 'mqtt_qos', fallback=cls.mqtt_qos),
+            dedup_group=conf.get('notifier', 'dedup_group', fallback=cls.dedup_group),
+            dedup_window=conf.getfloat('notifier', 'dedup_window', fallback=cls.dedup_window),
         )
 
 
@@ -52,7 +60,12 @@ class HANotifier(Notifier):
     def __init__(self, config: HANotifierConfig) -> None:
         self.config = config
         self.state = False
+        self.available = True
         self._connected_event = threading.Event()
+        # Outcome callbacks of the published states, called when the broker acknowledges them
+        self._pending: Dict[int, Outcome] = {}
+        self._acknowledged: Deque[int] = deque(maxlen=64)  # acknowledged before their callback was registered
+        self._lock = threading.Lock()
 
         self.state_topic = f'homeassistant/binary_sensor/{self.config.device_id}/state'
         self.availability_topic = f'homeassistant/binary_sensor/{self.config.device_id}/availability'
@@ -65,6 +78,15 @@ class HANotifier(Notifier):
         self.mqtt.on_publish = self._on_mqtt_publish
         self.mqtt.on_subscribe = self._on_mqtt_subscribe
         self.mqtt.on_message = self._on_mqtt_message
+
+        # Optional coordination with other instances hearing the same sound source. Set before connecting, as the
+        # messages are received in the network thread of the client
+        self.election = None
+        self.suppressed = False  # detection not notified, it lost the election or it is still running
+        if self.config.dedup_group:
+            self.election = Election(self.mqtt, f'ringr/election/{self.config.dedup_group}', self.config.device_id,
+                                     self.config.dedup_window, self.config.mqtt_qos)
+
         self.mqtt.will_set(self.availability_topic, self.dev_offline_payload, qos=self.config.mqtt_qos, retain=True)
         self.mqtt.connect(host=self.config.mqtt_host, port=self.config.mqtt_port)
         self.mqtt.loop_start()
@@ -75,9 +97,41 @@ class HANotifier(Notifier):
         self._subscribe(self.ha_status_topic)
         self._send_config()
 
-    def notify(self, state: bool) -> None:
+        if self.election is not None:
+            self._subscribe(self.election.topic)
+
+    def notify(self, state: bool, detection: Optional[Detection] = None, callback: Optional[Outcome] = None) -> None:
+        if self.election is not None:
+            if state:
+                # The state is notified only if this node wins the election
+                self.suppressed = True
+                self.election.run(detection or Detection(time.time(), 0), partial(self._on_election, callback=callback))
+                return
+            self.election.cancel()
+            if self.suppressed:
+                self.suppressed = False
+                return
         self.state = state
-        self._send_state()
+        self._send_state(callback)
+
+    async def notify_async(self, state: bool, detection: Optional[Detection] = None,
+                           callback: Optional[Outcome] = None) -> None:
+        # Publishing only queues the message for the network loop of the MQTT client, it does not block
+        self.notify(state, detection, callback)
+
+    def set_availability(self, available: bool) -> None:
+        self.available = available
+        self._send_availability()
+
+    def _on_election(self, won: bool, callback: Optional[Outcome] = None) -> None:
+        if won:
+            self.suppressed = False
+            self.state = True
+            self._send_state(callback)
+        else:
+            log.info('Sound event notified by another node')
+            if callback is not None:
+                callback(False)
 
     def _send_config(self) -> None:
         topic = f'homeassistant/binary_sensor/{self.config.device_id}/config'
@@ -98,23 +152,42 @@ class HANotifier(Notifier):
         if self._publish(topic, json.dumps(payload)):
             log.info('Notified discovery device config: %s', payload)
 
-    def _send_state(self) -> None:
+    def _send_state(self, callback: Optional[Outcome] = None) -> None:
         payload = self.dev_detected_payload if self.state else self.dev_undetected_payload
-        if self._publish(self.state_topic, payload):
+        if self._publish(self.state_topic, payload, callback):
             log.info('Notified state changed: %s', payload.decode('UTF-8'))
 
     def _send_availability(self) -> None:
-        if self._publish(self.availability_topic, self.dev_online_payload):
-            log.info('Notified device available')
+        payload = self.dev_online_payload if self.available else self.dev_offline_payload
+        if self._publish(self.availability_topic, payload):
+            log.info('Notified device %s', 'available' if self.available else 'unavailable')
 
-    def _publish(self, topic: str, payload: Union[str, bytes]) -> bool:
+    def _publish(self, topic: str, payload: Union[str, bytes], callback: Optional[Outcome] = None) -> bool:
+        """ ``callback`` is called with True once the broker acknowledges the message, or with False if it is lost """
         msg_info = self.mqtt.publish(topic, payload=payload, qos=self.config.mqtt_qos, retain=True)
         if msg_info.rc == paho.MQTT_ERR_SUCCESS:
             log.debug('MQTT PUBLISH sent to topic %s. Message ID: %s', topic, msg_info.mid)
-            return True
+            published = True
         else:
             log.error('Unable to publish MQTT message to topic %s. Client is not connected', topic)
-            return False
+            published = False
+        if callback is not None:
+            if published or (msg_info.rc == paho.MQTT_ERR_NO_CONN and self.config.mqtt_qos > 0):
+                # QoS 1 and 2 messages are kept by the client and sent again once reconnected
+                self._track(msg_info.mid, callback)
+            else:
+                callback(False)
+        return published
+
+    def _track(self, mid: int, callback: Outcome) -> None:
+        with self._lock:
+            acknowledged = mid in self._acknowledged
+            if acknowledged:
+                self._acknowledged.remove(mid)
+            else:
+                self._pending[mid] = callback
+        if acknowledged:
+            callback(True)
 
     def _subscribe(self, topic: str) -> bool:
         rc, mid = self.mqtt.subscribe(topic)
@@ -138,11 +211,19 @@ class HANotifier(Notifier):
 
     def _on_mqtt_publish(self, client, userdata, mid):
         log.debug('MQTT PUBACK received for message %s', mid)
+        with self._lock:
+            callback = self._pending.pop(mid, None)
+            if callback is None:
+                self._acknowledged.append(mid)
+        if callback is not None:
+            callback(True)
 
     def _on_mqtt_subscribe(self, client, userdata, mid, granted_qos):
         log.debug('MQTT SUBACK received for message %s', mid)
 
     def _on_mqtt_message(self, client, userdata, msg):
-        if msg.topic == self.ha_status_topic and msg.payload == self.ha_status_online_payload:
+        if self.election is not None and msg.topic == self.election.topic:
+            self.election.receive(msg.payload)
+        elif msg.topic == self.ha_status_topic and msg.payload == self.ha_status_online_payload:
             log.info('Home Assistant MQTT integration start detected. Resending discovery message')
             self._send_config()
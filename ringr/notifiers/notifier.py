@@ -1,7 +1,8 @@
+import asyncio
 from abc import ABC, abstractmethod
 
 from dataclasses import dataclass
-from typing import Type
+from typing import Callable, Optional, Type
 
 from ringr.config_parser import EnvConfigParser
 
@@ -15,7 +16,36 @@ class NotifierConfig(ABC):
         raise NotImplementedError()
 
 
+@dataclass(frozen=True)
+class Detection:
+    """ Details of a detected sound event """
+    time: float  # wall-clock time of the block that triggered the detection
+    confidence: float  # magnitude of the detection rule in that block
+    rule: Optional[str] = None  # description of the detection rule, e.g. frequency:1000
+
+
+# Called with whether a detection was delivered, once it is known
+Outcome = Callable[[bool], None]
+
+
 class Notifier(ABC):
     @abstractmethod
-    def notify(self, state: bool) -> None:
+    def notify(self, state: bool, detection: Optional[Detection] = None, callback: Optional[Outcome] = None) -> None:
+        """
+        Notify a state change. ``callback`` is called with the outcome of the notification of a detection once it is
+        known, possibly from another thread. It is not called if the notifier can't know it.
+        """
         raise NotImplementedError()
+
+    def set_availability(self, available: bool) -> None:
+        """ Report whether the detector is capturing audio, e.g. while the input device is unplugged """
+        pass
+
+    def close(self) -> None:
+        """ Release the resources of the notifier, delivering the pending notifications if any """
+        pass
+
+    async def notify_async(self, state: bool, detection: Optional[Detection] = None,
+                           callback: Optional[Outcome] = None) -> None:
+        """ Notify from an asyncio event loop. By default, the blocking notify is run in the default executor """
+        await asyncio.get_running_loop().run_in_executor(None, self.notify, state, detection, callback)
@@ -3,8 +3,9 @@ import json
 import logging
 
 from dataclasses import dataclass
+from typing import Optional
 
-from ringr.notifiers.notifier import Notifier, NotifierConfig
+from ringr.notifiers.notifier import Detection, Notifier, NotifierConfig, Outcome
 from ringr.config_parser import EnvConfigParser
 
 log = logging.getLogger('ringr')
@@ -15,6 +16,7 @@ class TelegramNotifierConfig(NotifierConfig):
     api_token: str
     chat_id: str
     message: str = 'Event detected'
+    api_url: str = 'https://api.telegram.org'
 
     @classmethod
     def configure(cls, conf: EnvConfigParser):
@@ -23,15 +25,16 @@ class TelegramNotifierConfig(NotifierConfig):
             api_token=conf.get('notifier', 'api_token'),
             chat_id=conf.get('notifier', 'chat_id'),
             message=conf.get('notifier', 'message', fallback=cls.message),
+            api_url=conf.get('notifier', 'api_url', fallback=cls.api_url),
         )
 
 
 class TelegramNotifier(Notifier):
-    url_formatter = 'https://api.telegram.org/bot{api_token}/sendMessage'
+    url_formatter = '{api_url}/bot{api_token}/sendMessage'
 
     def __init__(self, config: TelegramNotifierConfig):
         self.config = config
-        url = self.url_formatter.format(api_token=self.config.api_token)
+        url = self.url_formatter.format(api_url=self.config.api_url.rstrip('/'), api_token=self.config.api_token)
         payload = {
             'chat_id': self.config.chat_id,
             'text': self.config.message
@@ -39,9 +42,11 @@ class TelegramNotifier(Notifier):
         self.request = urllib.request.Request(url, json.dumps(payload).encode(),
                                               headers={'Content-Type': 'application/json'})
 
-    def notify(self, state: bool) -> None:
+    def notify(self, state: bool, detection: Optional[Detection] = None, callback: Optional[Outcome] = None) -> None:
         if state:
             response = urllib.request.urlopen(self.request)
             if response.status != 200:
                 log.error('Error notifying detection to telegram bot. Status code: %d', response.status)
             log.debug('Notified detection')
+            if callback is not None:
+                callback(response.status == 200)
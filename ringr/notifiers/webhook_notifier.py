@@ -0,0 +1,174 @@
+import json
+import time
+import queue
+import logging
+import threading
+import http.client
+import urllib.parse
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from string import Template
+from typing import Any, Dict, List, Optional, Tuple
+
+from ringr.notifiers.notifier import Detection, Notifier, NotifierConfig, Outcome
+from ringr.batch import next_batch
+from ringr.config_parser import EnvConfigParser
+from ringr.exceptions import RingrDetectorError
+
+
+log = logging.getLogger('ringr')
+
+
+@dataclass(frozen=True)
+class WebhookNotifierConfig(NotifierConfig):
+    url: str
+    template: Optional[str] = None
+    token: Optional[str] = None
+    device_id: str = 'ringr_01'
+    batch_size: int = 1
+    batch_latency: float = 0.5
+    connections: int = 1
+    timeout: float = 10.0
+
+    @classmethod
+    def configure(cls, conf: EnvConfigParser):
+        return cls(
+            type=conf.get('notifier', 'type'),
+            url=conf.get('notifier', 'url'),
+            template=conf.get('notifier', 'template', fallback=cls.template),
+            token=conf.get('notifier', 'token', fallback=cls.token),
+            device_id=conf.get('notifier', 'device_id', fallback=cls.device_id),
+            batch_size=conf.getint('notifier', 'batch_size', fallback=cls.batch_size),
+            batch_latency=conf.getfloat('notifier', 'batch_latency', fallback=cls.batch_latency),
+            connections=conf.getint('notifier', 'connections', fallback=cls.connections),
+            timeout=conf.getfloat('notifier', 'timeout', fallback=cls.timeout),
+        )
+
+
+def render(template: Any, values: Dict[str, Any]) -> Any:
+    """
+    Replace the ``$name`` placeholders of the strings of a JSON template. Strings consisting of a single placeholder
+    are replaced by the value itself, keeping its JSON type.
+    """
+    if isinstance(template, dict):
+        return {key: render(value, values) for key, value in template.items()}
+    elif isinstance(template, list):
+        return [render(value, values) for value in template]
+    elif isinstance(template, str):
+        if template.startswith('$') and template[1:] in values:
+            return values[template[1:]]
+        return Template(template).safe_substitute(values)
+    return template
+
+
+class WebhookNotifier(Notifier):
+    """
+    Posts the detections as JSON to an HTTP endpoint.
+
+    Detections are queued and posted by ``connections`` worker threads, each one with its own keep-alive connection, so
+    the detector never waits for the endpoint. With ``batch_size`` greater than 1, each request carries a JSON array of
+    up to ``batch_size`` detections, posted at most ``batch_latency`` seconds after the first one of the batch.
+    """
+    default_template = {
+        'device_id': '$device_id',
+        'rule': '$rule',
+        'time': '$time',
+        'confidence': '$confidence',
+    }
+
+    def __init__(self, config: WebhookNotifierConfig) -> None:
+        self.config = config
+        url = urllib.parse.urlsplit(self.config.url)
+        if url.scheme not in ('http', 'https') or not url.hostname:
+            raise RingrDetectorError(f'Invalid webhook URL: {self.config.url}')
+        self.connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.host = url.hostname
+        self.port = url.port
+        self.path = (url.path or '/') + (f'?{url.query}' if url.query else '')
+        self.headers = {'Content-Type': 'application/json'}
+        if self.config.token:
+            self.headers['Authorization'] = f'Bearer {self.config.token}'
+
+        try:
+            self.template = json.loads(self.config.template) if self.config.template else self.default_template
+        except ValueError as e:
+            raise RingrDetectorError(f'Invalid webhook template: {e}') from e
+
+        self.queue: queue.Queue = queue.Queue()
+        self._workers = [threading.Thread(target=self._run, name=f'ringr-webhook-{i}', daemon=True)
+                         for i in range(self.config.connections)]
+        for worker in self._workers:
+            worker.start()
+
+    def notify(self, state: bool, detection: Optional[Detection] = None, callback: Optional[Outcome] = None) -> None:
+        if state:
+            detection = detection or Detection(time.time(), 0.0)
+            self.queue.put((render(self.template, {
+                'device_id': self.config.device_id,
+                'rule': detection.rule,
+                'time': detection.time,
+                'iso_time': datetime.fromtimestamp(detection.time, timezone.utc).isoformat(),
+                'confidence': detection.confidence,
+            }), callback))
+
+    async def notify_async(self, state: bool, detection: Optional[Detection] = None,
+                           callback: Optional[Outcome] = None) -> None:
+        # Notifying only queues the payload for the workers, it does not block
+        self.notify(state, detection, callback)
+
+    def close(self) -> None:
+        """ Post the pending detections and stop the workers """
+        for _ in self._workers:
+            self.queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def _run(self) -> None:
+        connection = None
+        stopped = False
+        while not stopped:
+            batch, stopped = next_batch(self.queue, self.config.batch_size, self.config.batch_latency)
+            if batch:
+                connection, delivered = self._post(connection, [payload for payload, _ in batch])
+                for _, callback in batch:
+                    if callback is not None:
+                        callback(delivered)
+        if connection:
+            connection.close()
+
+    def _post(self, connection: Optional[http.client.HTTPConnection],
+              batch: List[Any]) -> Tuple[Optional[http.client.HTTPConnection], bool]:
+        """
+        Post a batch of detections. Returns the connection to reuse, if it is still open, and whether the batch was
+        accepted
+        """
+        body = json.dumps(batch if self.config.batch_size > 1 else batch[0]).encode()
+        # The server may close a kept-alive connection while it is idle
+        retry = connection is not None
+        while True:
+            if connection is None:
+                connection = self.connection_class(self.host, self.port, timeout=self.config.timeout)
+            response = None
+            try:
+                connection.request('POST', self.path, body, self.headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                connection = None
+                if retry and response is None and isinstance(e, (ConnectionResetError, BrokenPipeError)):
+                    # Closed before any response (including http.client.RemoteDisconnected). Retry once with a new one
+                    retry = False
+                    continue
+                log.error('Unable to post %s detections to the webhook', len(batch), exc_info=True)
+                return None, False
+
+            if response.status >= 300:
+                log.error('Error posting %s detections to the webhook. Status code: %d', len(batch), response.status)
+            else:
+                log.debug('Posted %s detections to the webhook', len(batch))
+            if response.will_close:
+                connection.close()
+                connection = None
+            return connection, response.status < 300
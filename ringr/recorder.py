@@ -0,0 +1,104 @@
+import logging
+
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+
+log = logging.getLogger('ringr')
+
+
+def record_dtype(num_values: int) -> np.dtype:
+    """ Fixed-width record stored for each analyzed block """
+    return np.dtype([
+        ('block', '<u8'),  # block counter of the stream, starting at 1. Zero marks an unused slot
+        ('time', '<f8'),  # stream time in seconds since the epoch
+        ('magnitude', '<f4', (num_values,)),  # magnitude of each rule
+        ('hits', '<u2'),  # number of hits in the sliding window
+        ('state', 'u1'),  # detection state after processing the block
+    ])
+
+
+class FlightRecorder:
+    """
+    Append-only, memory-mapped binary log of the detection features of each analyzed block.
+
+    Records are written into segment files of ``segment_size`` records (NumPy ``.npy`` format) inside ``path``.
+    When a segment is full a new one is created and the oldest segments are removed to keep ``max_segments`` at most.
+    """
+    suffix = '.npy'
+
+    def __init__(self, path: Union[str, Path], segment_size: int = 72000, max_segments: int = 24) -> None:
+        self.path = Path(path)
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.dtype = None
+        self.segment = None
+        self.index = 0
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def append(self, block: int, time: float, magnitude: Sequence[float], hits: int, state: bool) -> None:
+        if self.segment is None:
+            # Record size depends on the number of rules of the detector, known on the first block
+            self.dtype = record_dtype(np.size(magnitude))
+            self._open_segment()
+        elif self.index == self.segment_size:
+            self._open_segment()
+        self.segment[self.index] = (block, time, magnitude, hits, state)
+        self.index += 1
+
+    def close(self) -> None:
+        if self.segment is not None:
+            self.segment.flush()
+            self.segment = None
+
+    def _open_segment(self) -> None:
+        self.close()
+        segments = list_segments(self.path)
+        number = int(segments[-1].stem) + 1 if segments else 0
+        file = self.path / f'{number:010d}{self.suffix}'
+        self.segment = np.lib.format.open_memmap(file, mode='w+', dtype=self.dtype, shape=(self.segment_size,))
+        self.index = 0
+        log.debug('Flight recorder segment opened: %s', file)
+
+        for old_file in segments[:max(0, len(segments) + 1 - self.max_segments)]:
+            old_file.unlink()
+            log.debug('Flight recorder segment removed: %s', old_file)
+
+
+def list_segments(path: Union[str, Path]) -> list:
+    return sorted(Path(path).glob(f'*{FlightRecorder.suffix}'))
+
+
+def read_records(path: Union[str, Path], start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+    """
+    Load the records of the flight recorder stored in ``path`` whose time is within [start, end].
+
+    Segments are memory-mapped and only the matching slices are copied. Segments written with a different record
+    layout than the latest one (e.g. after changing the detection rules) are ignored.
+    """
+    segments = list_segments(path)
+    if not segments:
+        return np.empty(0, dtype=record_dtype(1))
+
+    dtype = np.load(segments[-1], mmap_mode='r').dtype
+    chunks = []
+    for file in segments:
+        records = np.load(file, mmap_mode='r')
+        if records.dtype != dtype:
+            log.warning('Ignoring flight recorder segment with a different record layout: %s', file)
+            continue
+        # Records are appended sequentially, so the used slots are always a prefix of the segment
+        used = records['block'] != 0
+        records = records[:used.size if used.all() else used.argmin()]
+        times = records['time']
+        lo = 0 if start is None else np.searchsorted(times, start, side='left')
+        hi = len(records) if end is None else np.searchsorted(times, end, side='right')
+        if lo < hi:
+            chunks.append(records[lo:hi])
+
+    if not chunks:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate(chunks)
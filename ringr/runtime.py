@@ -0,0 +1,163 @@
+import time
+import signal
+import asyncio
+import logging
+import contextlib
+
+from functools import partial
+from typing import Any, List, Optional
+
+import numpy as np
+import sounddevice as sd
+
+from .audio import AudioDetector, Backoff, reinitialize_portaudio
+from .notifiers import Detection, Outcome
+
+
+log = logging.getLogger('ringr')
+
+
+class AsyncAudioDetector(AudioDetector):
+    """
+    Audio detector driven by an asyncio event loop.
+
+    Audio blocks are handed from the PortAudio thread to a queue of the event loop, where they are analyzed, and the
+    notifier is called through its async interface.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks = set()
+        super().__init__(*args, **kwargs)
+
+    def attach(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue) -> None:
+        self.loop = loop
+        self.queue = queue
+
+    def callback(self, indata: np.ndarray, frames: int, stime: Any, status: sd.CallbackFlags) -> None:
+        """This is called (from a separate thread) for each audio block."""
+        self.last_callback = time.monotonic()
+        if status:
+            log.error('Error status: %s', status)
+        # The input buffer is reused by PortAudio once the callback returns
+        self.loop.call_soon_threadsafe(self._enqueue, indata.copy(), frames, stime.inputBufferAdcTime)
+
+    def _enqueue(self, data: np.ndarray, frames: int, adc_time: float) -> None:
+        try:
+            self.queue.put_nowait((self, data, frames, adc_time))
+        except asyncio.QueueFull:
+            # Keep the stream time based on frames right
+            self.frames += frames
+            log.warning('Audio block discarded. The analysis is falling behind')
+
+    def notify(self, state: bool) -> Optional[bool]:
+        if self.loop is None:
+            # Initial state, notified before the event loop is running
+            return super().notify(state)
+        detection = self.get_detection() if state else None
+        callback = partial(self.notified, self.stream_time, self.event) if state else None
+        task = self.loop.create_task(self.notify_async(state, detection, callback))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        # Not known yet whether the notifier accepts the state
+        return None
+
+    async def notify_async(self, state: bool, detection: Optional[Detection], callback: Optional[Outcome]) -> None:
+        try:
+            await self.notifier.notify_async(state, detection, callback)
+        except Exception:
+            log.error('Unable to notify state: %s', state, exc_info=True)
+            if callback is not None:
+                callback(False)
+
+
+class AsyncRuntime:
+    """ Runs the capture, the detection and the notifications of multiple detectors in a single event loop """
+    signals = (signal.SIGINT, signal.SIGTERM)
+
+    def __init__(self, detectors: List[AsyncAudioDetector], queue_size: int = 100, shutdown_timeout: float = 5) -> None:
+        self.detectors = detectors
+        self.queue_size = queue_size
+        self.shutdown_timeout = shutdown_timeout
+        self.stopped: Optional[asyncio.Event] = None
+
+    def run(self) -> None:
+        asyncio.run(self.main())
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    async def main(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        for sig in self.signals:
+            with contextlib.suppress(NotImplementedError):  # Not available on Windows
+                loop.add_signal_handler(sig, self.stop)
+
+        queue = asyncio.Queue(self.queue_size)
+        for detector in self.detectors:
+            detector.attach(loop, queue)
+        consumer = asyncio.create_task(self.consume(queue))
+        tasks = [consumer]
+        timeouts = [detector.watchdog for detector in self.detectors if detector.watchdog]
+        if timeouts:
+            tasks.append(asyncio.create_task(self.watchdog(min(timeouts) / 2)))
+
+        try:
+            for detector in self.detectors:
+                detector.start_stream(detector.callback)
+            await self.stopped.wait()
+        finally:
+            for detector in self.detectors:
+                detector.close_stream()
+
+        log.info('Stopping detectors')
+        for task in tasks:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+        # Let in-flight notifications finish
+        pending = set().union(*(detector.tasks for detector in self.detectors))
+        if pending:
+            await asyncio.wait(pending, timeout=self.shutdown_timeout)
+
+        for sig in self.signals:
+            with contextlib.suppress(NotImplementedError):
+                loop.remove_signal_handler(sig)
+
+    async def watchdog(self, interval: float) -> None:
+        """ Reopen the streams of the detectors when any of them stalls """
+        backoff = Backoff(interval * 2, AudioDetector.max_retry_delay)
+        while True:
+            await asyncio.sleep(interval)
+            stalled = [detector for detector in self.detectors if detector.watchdog and detector.stream_stalled()]
+            if not stalled or not backoff.ready():
+                continue
+            for detector in stalled:
+                detector.stream_lost()
+                detector.close_stream()
+            missing = [detector for detector in stalled if not detector.reopen_stream(detector.callback)]
+            if not missing:
+                backoff.reset()
+                continue
+            # Plugged devices only show up after reinitializing PortAudio, which closes the streams of all the detectors
+            for detector in self.detectors:
+                detector.close_stream()
+            reinitialize_portaudio()
+            for detector in self.detectors:
+                # Availability is only reported again for the detectors whose device was missing
+                detector.reopen_stream(detector.callback)
+            if all(detector.stream is not None for detector in missing):
+                backoff.reset()
+            else:
+                backoff.failed()
+
+    async def consume(self, queue: asyncio.Queue) -> None:
+        while True:
+            detector, data, frames, adc_time = await queue.get()
+            try:
+                detector.process_block(data, frames, adc_time)
+            except Exception:
+                log.error('Error analyzing audio block', exc_info=True)
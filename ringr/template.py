@@ -0,0 +1,49 @@
+import logging
+
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+
+from .wav import read_spectra
+from .exceptions import RingrDetectorError
+
+
+log = logging.getLogger('ringr')
+
+
+class SpectralTemplate:
+    """
+    Spectral fingerprint of a reference sound.
+
+    Blocks are matched by the normalized correlation (Pearson) between their magnitude spectrum and the fingerprint,
+    so the match does not depend on the volume of the sound, only on the shape of its spectrum.
+    """
+    # Frames of the reference clip below this ratio of the loudest frame energy are considered silence
+    silence_ratio = 0.1
+
+    def __init__(self, fingerprint: np.ndarray) -> None:
+        # The DC bin is ignored
+        fingerprint = fingerprint[1:] - fingerprint[1:].mean()
+        norm = np.linalg.norm(fingerprint)
+        if norm == 0:
+            raise RingrDetectorError('Flat template spectrum')
+        self.fingerprint = fingerprint / norm
+
+    @classmethod
+    def from_wav(cls, file: Union[str, Path], samplerate: float, fftsize: int) -> 'SpectralTemplate':
+        """ Learn the fingerprint of a reference clip for blocks analyzed with the given samplerate and FFT size """
+        spectra = read_spectra(file, samplerate, fftsize)
+        energy = np.square(spectra).sum(axis=1)
+        active = spectra[energy >= energy.max() * cls.silence_ratio]
+        fingerprint = active.mean(axis=0)
+
+        log.debug('Template learnt from %s: %s active frames of %s', file, len(active), len(spectra))
+        return cls(fingerprint)
+
+    def match(self, magnitudes: np.ndarray) -> np.ndarray:
+        """ Normalized correlation of each channel of the magnitude spectrum (bins, channels) with the fingerprint """
+        magnitudes = magnitudes[1:]
+        centered = magnitudes - magnitudes.mean(axis=0)
+        norm = np.linalg.norm(centered, axis=0)
+        return (self.fingerprint @ centered) / np.maximum(norm, np.finfo(float).tiny)
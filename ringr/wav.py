@@ -0,0 +1,55 @@
+import wave
+
+from pathlib import Path
+from typing import Tuple, Union
+
+import numpy as np
+
+from .exceptions import RingrDetectorError
+
+
+def read_wav(file: Union[str, Path]) -> Tuple[np.ndarray, int]:
+    """ Read a PCM WAV file. Returns the samples in [-1, 1] with shape (frames, channels) and the samplerate """
+    with wave.open(str(file), 'rb') as wav:
+        width = wav.getsampwidth()
+        channels = wav.getnchannels()
+        samplerate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 2 ** 7
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / 2 ** 15
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        raw[:, 2] = raw[:, 2].astype(np.int8)  # sign of the most significant byte
+        samples = (raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)).astype(np.float32) / 2 ** 23
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype='<i4').astype(np.float32) / 2 ** 31
+    else:
+        raise RingrDetectorError(f'Unsupported WAV sample width: {width} bytes')
+
+    return samples.reshape(-1, channels), samplerate
+
+
+def read_spectra(file: Union[str, Path], samplerate: float, fftsize: int) -> np.ndarray:
+    """
+    Magnitude spectrum of consecutive frames of a WAV file (mixed to mono) with the frequency bins of the detector: the
+    bins of a FFT of ``fftsize`` samples at ``samplerate``. Magnitudes are normalized by the FFT size. Bins above the
+    Nyquist frequency of the file are 0. Returns an array with shape (frames, fftsize // 2 + 1)
+    """
+    samples, clip_samplerate = read_wav(file)
+    samples = samples.mean(axis=1)
+
+    # FFT size with the same frequency resolution than the detector, so the bins of both spectrums match
+    clip_fftsize = round(fftsize * clip_samplerate / samplerate)
+    num_frames = len(samples) // clip_fftsize
+    if num_frames == 0:
+        raise RingrDetectorError(f'Clip too short: {file}')
+    frames = samples[:num_frames * clip_fftsize].reshape(num_frames, clip_fftsize)
+    clip_spectra = np.abs(np.fft.rfft(frames, axis=1)) / clip_fftsize
+
+    num_bins = fftsize // 2 + 1
+    spectra = np.zeros((num_frames, num_bins))
+    spectra[:, :min(num_bins, clip_spectra.shape[1])] = clip_spectra[:, :num_bins]
+    return spectra
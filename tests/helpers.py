@@ -0,0 +1,12 @@
+import wave
+
+import numpy as np
+
+
+def write_wav(file, samples, samplerate):
+    """ Write mono samples in [-1, 1] as a 16-bit PCM WAV file """
+    with wave.open(str(file), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(samplerate)
+        wav.writeframes((np.clip(samples, -1, 1 - 2 ** -15) * 2 ** 15).astype('<i2').tobytes())
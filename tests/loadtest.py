@@ -0,0 +1,336 @@
+"""
+Load-test harness of the notifiers.
+
+It runs the real notifiers against local stand-ins: a minimal in-process MQTT broker for ``HANotifier`` and a HTTP
+server mimicking the Telegram Bot API for ``TelegramNotifier``. It drives many state changes through them and
+reports the throughput, the latency percentiles and the lost and duplicated messages.
+
+    PYTHONPATH=. python tests/loadtest.py --events 5000 --puback-delay 0.01 --restart-after 2500
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import threading
+
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ringr.notifiers.ha_notifier import HANotifier, HANotifierConfig
+from ringr.notifiers.telegram_notifier import TelegramNotifier, TelegramNotifierConfig
+
+
+log = logging.getLogger('ringr')
+
+
+CONNECT = 1
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+UNSUBSCRIBE = 10
+PINGREQ = 12
+DISCONNECT = 14
+
+
+def mqtt_packet(packet_type: int, flags: int, body: bytes) -> bytes:
+    length = len(body)
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            break
+    return bytes([packet_type << 4 | flags]) + bytes(encoded) + body
+
+
+class MQTTBrokerStandIn:
+    """
+    Minimal MQTT 3.1.1 broker that accepts every connection and subscription and records the published messages.
+
+    Messages are not forwarded to the subscribers. Acknowledgements of QoS 1 and 2 messages can be delayed by
+    ``puback_delay`` seconds to emulate a slow broker, and ``restart`` drops all the connections.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, puback_delay: float = 0) -> None:
+        self.host = host
+        self.port = port
+        self.puback_delay = puback_delay
+        self.messages: List[Tuple[float, str, bytes, bool]] = []  # receive time, topic, payload, dup flag
+        self.connections = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.writers = set()
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='mqtt-broker', daemon=True)
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._disconnect(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+    def restart(self) -> None:
+        """ Drop all the connections and listen again on the same port """
+        asyncio.run_coroutine_threadsafe(self._restart(), self.loop).result()
+
+    def received(self, topic: str) -> List[Tuple[float, bytes, bool]]:
+        return [(t, payload, dup) for t, message_topic, payload, dup in list(self.messages) if message_topic == topic]
+
+    def _run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._listen())
+        self._started.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def _listen(self) -> None:
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def _restart(self) -> None:
+        await self._disconnect()
+        await self._listen()
+
+    async def _disconnect(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+        for writer in list(self.writers):
+            writer.close()
+        # The handlers end when they read the end of their streams
+        while self.writers:
+            await asyncio.sleep(0.01)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.writers.add(writer)
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length, multiplier = 0, 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length)
+                if not self._process(header[0] >> 4, header[0] & 0x0F, body, writer):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    def _write(writer: asyncio.StreamWriter, data: bytes) -> None:
+        if not writer.is_closing():
+            writer.write(data)
+
+    def _process(self, packet_type: int, flags: int, body: bytes, writer: asyncio.StreamWriter) -> bool:
+        if packet_type == CONNECT:
+            self.connections += 1
+            writer.write(mqtt_packet(2, 0, b'\x00\x00'))
+        elif packet_type == PUBLISH:
+            qos = flags >> 1 & 0x03
+            topic_length = int.from_bytes(body[:2], 'big')
+            topic = body[2:2 + topic_length].decode()
+            payload_start = 2 + topic_length + (2 if qos else 0)
+            self.messages.append((time.monotonic(), topic, body[payload_start:], bool(flags & 0x08)))
+            if qos:
+                packet_id = body[2 + topic_length:payload_start]
+                ack = mqtt_packet(PUBACK if qos == 1 else PUBREC, 0, packet_id)
+                self.loop.call_later(self.puback_delay, self._write, writer, ack)
+        elif packet_type == PUBREL:
+            writer.write(mqtt_packet(PUBCOMP, 0, body[:2]))
+        elif packet_type == SUBSCRIBE:
+            num_topics, i = 0, 2
+            while i < len(body):
+                i += 2 + int.from_bytes(body[i:i + 2], 'big') + 1
+                num_topics += 1
+            writer.write(mqtt_packet(9, 0, body[:2] + bytes([0]) * num_topics))
+        elif packet_type == UNSUBSCRIBE:
+            writer.write(mqtt_packet(11, 0, body[:2]))
+        elif packet_type == PINGREQ:
+            writer.write(mqtt_packet(13, 0, b''))
+        elif packet_type == DISCONNECT:
+            return False
+        return True
+
+
+class TelegramStandIn:
+    """ Local HTTP server mimicking the sendMessage method of the Telegram Bot API """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, delay: float = 0) -> None:
+        self.requests: List[Tuple[float, str, dict]] = []  # receive time, path, body
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stand_in.requests.append((time.monotonic(), self.path, body))
+                if delay:
+                    time.sleep(delay)
+                response = json.dumps({'ok': True, 'result': {'message_id': len(stand_in.requests)}}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f'http://{host}:{self.server.server_address[1]}'
+        self._thread = threading.Thread(target=self.server.serve_forever, name='telegram-api', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TracedHANotifier(HANotifier):
+    """ HANotifier that numbers the state messages, so every message can be traced to its notification """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.seq = 0
+        super().__init__(*args, **kwargs)
+
+    def _send_state(self, callback=None) -> None:
+        self.seq += 1
+        payload = self.dev_detected_payload if self.state else self.dev_undetected_payload
+        self._publish(self.state_topic, payload + b' %d' % self.seq, callback)
+
+
+@dataclass
+class LoadReport:
+    name: str
+    sent: int
+    received: int
+    lost: int
+    duplicates: int
+    elapsed: float
+    latencies: np.ndarray  # seconds
+
+    @property
+    def throughput(self) -> float:
+        return self.received / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, q: float) -> float:
+        return float(np.percentile(self.latencies, q)) * 1000 if len(self.latencies) else float('nan')
+
+    def __str__(self) -> str:
+        return (f'{self.name}: {self.sent} sent, {self.received} received, {self.lost} lost, '
+                f'{self.duplicates} duplicated in {self.elapsed:.2f} s ({self.throughput:.0f} msg/s). Latency (ms): '
+                f'p50 {self.percentile(50):.2f}, p95 {self.percentile(95):.2f}, p99 {self.percentile(99):.2f}, '
+                f'max {self.percentile(100):.2f}')
+
+
+def run_ha(events: int, rate: Optional[float] = None, puback_delay: float = 0, qos: int = 1,
+           restart_after: Optional[int] = None, timeout: float = 30) -> LoadReport:
+    """ Drive ``events`` state changes through HANotifier, at most ``rate`` per second """
+    broker = MQTTBrokerStandIn(puback_delay=puback_delay)
+    broker.start()
+    notifier = TracedHANotifier(HANotifierConfig(type='ha', mqtt_host=broker.host, mqtt_port=broker.port,
+                                                 mqtt_qos=qos))
+    try:
+        sent: Dict[int, float] = {}
+        start = time.monotonic()
+        for i in range(events):
+            if i == restart_after:
+                broker.restart()
+            sent[notifier.seq + 1] = time.monotonic()
+            notifier.notify(i % 2 == 0)
+            if rate:
+                time.sleep(max(0.0, start + (i + 1) / rate - time.monotonic()))
+
+        # Wait until every message arrives, or nothing arrives for a while (lost messages)
+        deadline = time.monotonic() + timeout
+        last_progress, count = time.monotonic(), 0
+        while time.monotonic() < deadline and time.monotonic() - last_progress < 2:
+            received = {int(payload.split()[1]) for _, payload, _ in broker.received(notifier.state_topic)}
+            if sent.keys() <= received:
+                break
+            if len(received) > count:
+                last_progress, count = time.monotonic(), len(received)
+            time.sleep(0.05)
+
+        messages = broker.received(notifier.state_topic)
+        arrivals: Dict[int, float] = {}
+        for t, payload, _ in messages:
+            arrivals.setdefault(int(payload.split()[1]), t)
+        latencies = np.array([arrivals[seq] - t for seq, t in sent.items() if seq in arrivals])
+        elapsed = max(arrivals.values(), default=start) - start
+        name = f'HANotifier QoS {qos}' + (f', PUBACK delay {puback_delay * 1000:g} ms' if puback_delay else '') + \
+            (f', broker restart after {restart_after}' if restart_after is not None else '')
+        return LoadReport(name, len(sent), len(sent.keys() & arrivals.keys()), len(sent.keys() - arrivals.keys()),
+                          len(messages) - len(arrivals), elapsed, latencies)
+    finally:
+        notifier.mqtt.loop_stop()
+        notifier.mqtt.disconnect()
+        broker.stop()
+
+
+def run_telegram(events: int, delay: float = 0) -> LoadReport:
+    """ Notify ``events`` detections through TelegramNotifier. Each notification is a blocking HTTP request """
+    api = TelegramStandIn(delay=delay)
+    api.start()
+    notifier = TelegramNotifier(TelegramNotifierConfig(type='telegram', api_token='token', chat_id='chat',
+                                                       api_url=api.url))
+    try:
+        latencies = []
+        errors = 0
+        start = time.monotonic()
+        for _ in range(events):
+            t = time.monotonic()
+            try:
+                notifier.notify(True)
+            except OSError:
+                errors += 1
+                continue
+            latencies.append(time.monotonic() - t)
+        elapsed = time.monotonic() - start
+        received = len(api.requests)
+        name = 'TelegramNotifier' + (f', API delay {delay * 1000:g} ms' if delay else '')
+        return LoadReport(name, events, received, events - received, 0, elapsed, np.array(latencies))
+    finally:
+        api.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Load test of the ringr notifiers')
+    parser.add_argument('--events', help='Number of state changes', type=int, default=2000)
+    parser.add_argument('--rate', help='Maximum state changes per second. Unlimited by default', type=float)
+    parser.add_argument('--qos', help='MQTT QoS', type=int, default=1)
+    parser.add_argument('--puback-delay', help='Delay of the MQTT acknowledgements in seconds', type=float,
+                        default=0)
+    parser.add_argument('--restart-after', help='Restart the broker after this number of state changes', type=int)
+    parser.add_argument('--http-delay', help='Response time of the Telegram API stand-in in seconds', type=float,
+                        default=0)
+    parser.add_argument('-v', '--verbose', help='Show the errors of the notifiers', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR if args.verbose else logging.CRITICAL)
+    print(run_ha(args.events, args.rate, args.puback_delay, args.qos, args.restart_after))
+    print(run_telegram(args.events, args.http_delay))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import unittest
+from unittest.mock import Mock
+
+import logging
+
+import numpy as np
+
+from ringr.aggregator import Aggregator, NodeBank
+from ringr.config import DetectorConfig
+from ringr.features import FeatureFrame, encode_frame
+from ringr.exceptions import RingrDetectorError
+
+
+# Don't show logging messages while testing
+logging.disable(logging.CRITICAL)
+
+
+class NodeBankTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # 4 blocks per window, 3 hits needed, 10 seconds of cooldown
+        self.bank = NodeBank(peak_blocks=4, acceptable_peak_blocks=3, threshold=0.5, cooldown_secs=10, capacity=2)
+        for node_id in ('a', 'b', 'c'):
+            self.bank.add_node(node_id)
+
+    def update(self, values, time):
+        return self.bank.update(np.array([0, 1, 2]), np.array(values), np.full(3, float(time)))
+
+    def test_grow(self):
+        self.assertEqual(3, len(self.bank))
+        self.assertEqual((4, 4), self.bank.windows.shape)
+
+    def test_detection(self):
+        self.assertEqual([], self.update([0.9, 0.9, 0.1], 1))
+        self.assertEqual([], self.update([0.9, 0.1, 0.1], 2))
+        self.assertEqual([], self.update([0.9, 0.1, 0.1], 3))
+        self.assertEqual([(0, True)], self.update([0.1, 0.9, 0.9], 4))
+        np.testing.assert_array_equal([3, 2, 1], self.bank.hits[:3])
+
+        # Node b: the oldest hit leaves the window when a new one enters
+        self.assertEqual([], self.update([0.1, 0.9, 0.1], 5))
+        self.assertEqual([(1, True)], self.update([0.1, 0.9, 0.1], 6))
+
+    def test_cooldown(self):
+        for time in range(4):
+            self.update([0.9, 0.1, 0.1], time)
+        self.assertTrue(self.bank.state[0])
+
+        self.assertEqual([], self.update([0.1, 0.1, 0.1], 12))
+        self.assertEqual([(0, False)], self.update([0.1, 0.1, 0.1], 13.5))
+        self.assertFalse(self.bank.state[0])
+
+    def test_detection_after_cooldown(self):
+        for time in range(4):
+            self.update([0.9, 0.1, 0.1], time)
+
+        self.assertEqual([(0, False), (0, True)], self.update([0.9, 0.1, 0.1], 14))
+        self.assertEqual(14, self.bank.last_detection_time[0])
+
+
+class AggregatorTestCase(unittest.TestCase):
+    config = DetectorConfig(
+        device=0,
+        threshold=50,
+        peak_duration=0.2,
+        frequency=1000,
+        acceptance_ratio=75,
+        cooldown_secs=10,
+        block_duration=50,
+    )
+
+    def setUp(self):
+        self.notifier = Mock()
+        self.aggregator = Aggregator(self.config, self.notifier, Mock())
+
+    @staticmethod
+    def packet(node_id, block, value):
+        bands = np.zeros(64, dtype=np.uint8)
+        bands[3] = value  # band of 1000 Hz
+        return encode_frame(FeatureFrame(node_id, block, block * 0.05, 44100, 510, bands))
+
+    def test_initial_state(self):
+        self.notifier.notify.assert_called_once_with(False)
+
+    def test_unsupported_mode(self):
+        config = DetectorConfig(device=0, threshold=50, peak_duration=0.2, frequency=0, mode='template')
+        with self.assertRaises(RingrDetectorError):
+            Aggregator(config, self.notifier, Mock())
+
+    def test_detection(self):
+        self.notifier.notify.reset_mock()
+
+        # Several blocks of the same node in a batch are processed in order
+        self.aggregator.process([self.packet('kitchen', block, 200) for block in (2, 1, 3)] +
+                                [self.packet('hall', 1, 0), b'garbage'])
+        self.notifier.notify.assert_not_called()
+
+        self.aggregator.process([self.packet('kitchen', 4, 200), self.packet('hall', 2, 0)])
+        self.notifier.notify.assert_called_once_with(True)
+        self.assertEqual({'kitchen': 0, 'hall': 1}, self.aggregator.bank.nodes)
+        self.assertEqual([3, 3], self.aggregator.bands)
+
+    def test_feature_layout_changed(self):
+        self.aggregator.process([self.packet('kitchen', 1, 200)])
+
+        # The node restarts with fewer feature bands
+        bands = np.full(16, 200, dtype=np.uint8)
+        self.aggregator.process([encode_frame(FeatureFrame('kitchen', 2, 0.1, 44100, 510, bands))])
+        self.assertEqual([0], self.aggregator.bands)
+
+    def test_invalid_packets(self):
+        no_bands = encode_frame(FeatureFrame('kitchen', 1, 0.05, 44100, 510, np.zeros(0, dtype=np.uint8)))
+        no_fft = encode_frame(FeatureFrame('kitchen', 1, 0.05, 44100, 1, np.zeros(64, dtype=np.uint8)))
+        no_samplerate = encode_frame(FeatureFrame('kitchen', 1, 0.05, 0, 510, np.zeros(64, dtype=np.uint8)))
+        bad_id = self.packet('kitchen', 1, 200).replace(b'kitchen', b'kitch\xffn')
+
+        # Discarded without stopping the aggregator
+        self.aggregator.process([no_bands, no_fft, no_samplerate, bad_id])
+        self.assertEqual({}, self.aggregator.bank.nodes)
+
+    def test_notify_once_for_several_nodes(self):
+        self.notifier.notify.reset_mock()
+
+        for block in range(1, 5):
+            self.aggregator.process([self.packet('kitchen', block, 200), self.packet('hall', block, 200)])
+
+        self.notifier.notify.assert_called_once_with(True)
@@ -1,10 +1,83 @@
 import unittest
-from unittest.mock import Mock, MagicMock, patch
+from unittest.mock import ANY, Mock, MagicMock, patch
 
 import numpy as np
 
-from ringr.audio import AudioDetector
+from ringr.audio import AudioDetector, Backoff, ToneSequence
 from ringr.config import DetectorConfig
+from ringr.notifiers import Detection
+from ringr.events import Event
+from ringr.exceptions import RingrDetectorError
+
+
+class ToneSequenceTestCase(unittest.TestCase):
+    A = (True, False)
+    B = (False, True)
+    NONE = (False, False)
+
+    def setUp(self):
+        # Tone A: 3-5 blocks, tone B: 2-4 blocks, 2 blocks of gap at most
+        self.sequence = ToneSequence(min_blocks=[3, 2], max_blocks=[5, 4], max_gap=2)
+
+    def process(self, blocks):
+        return [self.sequence.add(block) for block in blocks]
+
+    def test_match(self):
+        results = self.process([self.NONE, self.A, self.A, self.A, self.NONE, self.NONE, self.B, self.B])
+        self.assertEqual([False] * 7 + [True], results)
+
+    def test_match_without_gap(self):
+        results = self.process([self.A, self.A, self.A, self.A, self.B, self.B])
+        self.assertEqual([False] * 5 + [True], results)
+
+    def test_first_tone_too_short(self):
+        results = self.process([self.A, self.A, self.NONE, self.B, self.B])
+        self.assertFalse(any(results))
+
+    def test_first_tone_too_long(self):
+        results = self.process([self.A] * 10 + [self.B, self.B])
+        self.assertFalse(any(results))
+
+    def test_gap_too_long(self):
+        results = self.process([self.A, self.A, self.A, self.NONE, self.NONE, self.NONE, self.B, self.B])
+        self.assertFalse(any(results))
+
+    def test_wrong_order(self):
+        results = self.process([self.B, self.B, self.B, self.A, self.A, self.A])
+        self.assertFalse(any(results))
+
+    def test_restart_after_interrupted_sequence(self):
+        results = self.process([self.A, self.A, self.A, self.NONE, self.NONE, self.NONE,
+                                self.A, self.A, self.A, self.B, self.B])
+        self.assertEqual([False] * 10 + [True], results)
+        self.assertEqual(0, self.sequence.step)
+
+    def test_restart_on_first_tone_during_gap(self):
+        results = self.process([self.A, self.A, self.A, self.NONE, self.A, self.A, self.A, self.B, self.B])
+        self.assertEqual([False] * 8 + [True], results)
+
+
+class BackoffTestCase(unittest.TestCase):
+    @patch('ringr.audio.time.monotonic')
+    def test_backoff(self, mock_monotonic):
+        backoff = Backoff(1, 3)
+        mock_monotonic.return_value = 100
+        self.assertTrue(backoff.ready())
+
+        backoff.failed()
+        self.assertFalse(backoff.ready())
+        mock_monotonic.return_value = 101
+        self.assertTrue(backoff.ready())
+
+        backoff.failed()
+        mock_monotonic.return_value = 102.5
+        self.assertFalse(backoff.ready())  # Doubled
+        backoff.failed()
+        self.assertEqual(3, backoff.delay)  # Up to the maximum
+
+        backoff.reset()
+        self.assertTrue(backoff.ready())
+        self.assertEqual(1, backoff.delay)
 
 
 class AudioDetectorTestCase(unittest.TestCase):
@@ -26,6 +99,7 @@ class AudioDetectorTestCase(unittest.TestCase):
         self.notifier = Mock()
 
         AudioDetector.get_samplerate = Mock(return_value=44100)
+        AudioDetector.get_device_name = Mock(return_value='USB mic')
 
         self.sliding_window = MagicMock()
 
@@ -51,12 +125,220 @@ class AudioDetectorTestCase(unittest.TestCase):
         # FFT
         self.assertEqual(510, self.detector.fftsize)
         self.assertEqual(12, self.detector.freq_bin_idx)
+        self.assertEqual('float32', self.detector.dtype)
+        self.assertAlmostEqual(200 / 510, self.detector.magnitude_scale)
 
     def test_fft_filter(self):
         # This does not test the actual FFT calculation, this is delegated to numpy, but it tests there is
         # no undesired side effect or exception thrown
         self.assertAlmostEqual(9.634e-13, self.detector.get_fft_magnitude(self.data), delta=0.001)
 
+    def test_fft_filter_multiple_channels(self):
+        self.detector.channels = [0, 1]
+        self.assertAlmostEqual(9.634e-13, self.detector.get_fft_magnitude(self.data), delta=0.001)
+
+    def test_fft_filter_int16(self):
+        config = DetectorConfig(device=1, threshold=65, peak_duration=1.5, frequency=1000, gain=200, dtype='int16')
+        detector = AudioDetector(config, self.notifier)
+
+        # Same signal in float and integer formats produce the same normalized magnitude
+        signal = np.sin(2 * np.pi * 1000 * np.arange(2205) / 44100).reshape(-1, 1)
+        expected = self.detector.get_fft_magnitude(0.01 * signal)
+        magnitude = detector.get_fft_magnitude(np.round(0.01 * signal * 2 ** 15).astype(np.int16))
+        self.assertAlmostEqual(expected, magnitude, delta=0.001)
+        self.assertGreater(magnitude, 0.01)
+
+    @patch('ringr.audio.SpectralTemplate')
+    def test_fft_filter_template(self, mock_template):
+        config = DetectorConfig(device=1, threshold=65, peak_duration=1.5, frequency=0, mode='template',
+                                template='doorbell.wav', channels=(0, 1))
+        mock_template.from_wav.return_value.match.return_value = np.array([0.9, 0.4])
+
+        detector = AudioDetector(config, self.notifier)
+
+        mock_template.from_wav.assert_called_once_with('doorbell.wav', 44100, 510)
+        self.assertEqual(0.9, detector.get_fft_magnitude(self.data))
+        magnitudes = mock_template.from_wav.return_value.match.call_args[0][0]
+        self.assertEqual((256, 2), magnitudes.shape)
+
+    def test_fft_filter_sequence(self):
+        config = DetectorConfig(device=1, threshold=65, peak_duration=1.5, frequency=0, mode='sequence', gain=200,
+                                sequence=((1300, 0.4), (1000, 0.6)), sequence_gap=0.3, sequence_tolerance=0.5)
+        detector = AudioDetector(config, self.notifier)
+
+        self.assertEqual([16, 12], detector.sequence_bins)
+        self.assertEqual([4, 6], detector.tone_sequence.min_blocks)  # 0.2 and 0.3 secs with blocks of 50 ms
+        self.assertEqual([12, 18], detector.tone_sequence.max_blocks)  # 0.6 and 0.9 secs
+        self.assertEqual(6, detector.tone_sequence.max_gap)
+
+        signal = np.sin(2 * np.pi * 1000 * np.arange(2205) / 44100).reshape(-1, 1)
+        magnitude = detector.get_fft_magnitude(0.01 * signal)
+        self.assertEqual((2,), magnitude.shape)
+        self.assertLess(magnitude[0], magnitude[1])
+
+    def test_process_value_sequence(self):
+        config = DetectorConfig(device=1, threshold=65, peak_duration=1.5, frequency=0, mode='sequence',
+                                sequence=((1300, 0.4), (1000, 0.6)))
+        detector = AudioDetector(config, self.notifier)
+        detector.tone_sequence = Mock(last_step=1)
+        detector.tone_sequence.add.return_value = True
+
+        self.assertTrue(detector.process_value(np.array([0.7, 0.2])))
+        np.testing.assert_array_equal([True, False], detector.tone_sequence.add.call_args[0][0])
+
+    def test_sequence_event(self):
+        config = DetectorConfig(device=1, threshold=65, peak_duration=1.5, frequency=0, mode='sequence',
+                                sequence=((1300, 0.1), (1000, 0.1)), sequence_tolerance=0)
+        detector = AudioDetector(config, self.notifier)
+        detector.event_store = Mock()
+
+        # Two blocks of each tone
+        for values in ([0.7, 0.2], [0.7, 0.2], [0.2, 0.7]):
+            self.assertFalse(detector.process_value(np.array(values)))
+        self.assertEqual(1, detector.num_matches)
+        self.assertTrue(detector.process_value(np.array([0.2, 0.7])))
+        detector.update_state(True)
+
+        self.assertEqual(1.0, detector.event.hit_ratio)
+
+    def test_analyze_features(self):
+        config = DetectorConfig(device=1, threshold=0, peak_duration=0, frequency=0, mode='features', gain=200,
+                                feature_bands=32)
+        detector = AudioDetector(config, None)
+        detector.feature_publisher = Mock()
+
+        detector.analyze(self.data, 20)
+
+        block, stream_time, bands = detector.feature_publisher.publish.call_args[0]
+        self.assertEqual((1, 20), (block, stream_time))
+        self.assertEqual((32,), bands.shape)
+        self.assertFalse(detector.last_state)
+
+    def test_threshold_required(self):
+        config = DetectorConfig(device=1, threshold=0, peak_duration=1.5, frequency=1000)
+        with self.assertRaises(RingrDetectorError):
+            AudioDetector(config, self.notifier)
+
+    def test_default_watchdog(self):
+        self.assertEqual(0.5, self.detector.watchdog)
+
+        # 4 blocks and the latency of the device
+        config = DetectorConfig(device=1, threshold=65, peak_duration=1.5, frequency=1000, block_duration=1000,
+                                latency=0.1)
+        self.assertEqual(4.1, AudioDetector(config, self.notifier).watchdog)
+
+    def test_watchdog_shorter_than_block(self):
+        config = DetectorConfig(device=1, threshold=65, peak_duration=1.5, frequency=1000, block_duration=1000,
+                                watchdog=0.5)
+        with self.assertRaises(RingrDetectorError):
+            AudioDetector(config, self.notifier)
+
+    def test_watchdog_disabled(self):
+        config = DetectorConfig(device=1, threshold=65, peak_duration=1.5, frequency=1000, block_duration=1000,
+                                watchdog=0)
+        self.assertEqual(0, AudioDetector(config, self.notifier).watchdog)
+
+    def test_template_mode_without_template(self):
+        config = DetectorConfig(device=1, threshold=65, peak_duration=1.5, frequency=0, mode='template')
+        with self.assertRaises(RingrDetectorError):
+            AudioDetector(config, self.notifier)
+
+    def test_frequency_mode_without_frequency(self):
+        config = DetectorConfig(device=1, threshold=65, peak_duration=1.5, frequency=0)
+        with self.assertRaises(RingrDetectorError):
+            AudioDetector(config, self.notifier)
+
+    @patch('ringr.audio.time.monotonic', Mock(return_value=100))
+    def test_stream_stalled(self):
+        self.detector.stream = Mock(active=True)
+        self.detector.last_callback = 99.6
+        self.assertFalse(self.detector.stream_stalled())
+
+        self.detector.last_callback = 99.4
+        self.assertTrue(self.detector.stream_stalled())
+
+        self.detector.last_callback = 100
+        self.detector.stream.active = False
+        self.assertTrue(self.detector.stream_stalled())
+
+    def test_reopen_stream(self):
+        self.detector.open_stream = MagicMock()
+        self.detector.available = False
+
+        self.assertTrue(self.detector.reopen_stream(self.detector.callback))
+        self.assertEqual('USB mic', self.detector.device)
+        self.detector.open_stream.return_value.start.assert_called_once()
+        self.notifier.set_availability.assert_called_once_with(True)
+
+    def test_reopen_available_stream(self):
+        # e.g. reopened after reinitializing PortAudio for another detector
+        self.detector.open_stream = MagicMock()
+
+        self.assertTrue(self.detector.reopen_stream(self.detector.callback))
+        self.notifier.set_availability.assert_not_called()
+
+    def test_reopen_stream_device_not_found(self):
+        self.detector.get_samplerate = Mock(side_effect=ValueError('No input device matching'))
+        self.detector.stream = Mock()
+
+        self.assertFalse(self.detector.reopen_stream(self.detector.callback))
+        self.assertIsNone(self.detector.stream)
+        self.notifier.set_availability.assert_not_called()
+
+    @patch('ringr.audio.time.time', Mock(return_value=1100))
+    def test_analyze_reopened_stream(self):
+        self.detector.blocks = 10
+        self.detector.time_offset = 1000
+        self.detector.last_detection_time = 95  # 5 s before the last block of the previous stream
+        self.detector.last_state = True
+        self.detector.resync = True
+        self.detector.get_fft_magnitude = Mock()
+        self.detector.process_value = Mock(return_value=False)
+
+        # The clock of the new stream starts from 0
+        self.detector.analyze(self.data, 0)
+
+        self.assertEqual(1100, self.detector.time_offset)
+        self.assertEqual(-5, self.detector.last_detection_time)
+        self.assertTrue(self.detector.last_state)  # still in cooldown
+
+    def test_process_value_classifier_gate(self):
+        self.detector.classifier = Mock()
+        self.detector.probability = 0.3
+        self.detector.process_value(0.66)
+        self.sliding_window.add.assert_called_once_with(False)
+
+        self.sliding_window.add.reset_mock()
+        self.detector.probability = 0.8
+        self.detector.process_value(0.66)
+        self.sliding_window.add.assert_called_once_with(True)
+
+    def test_analyze_classify(self):
+        self.detector.classifier = Mock()
+        self.detector.classifier.predict.return_value = np.array([0.9])
+        self.detector.process_value = Mock(return_value=False)
+
+        self.detector.analyze(self.data, 1)
+
+        self.assertEqual(0.9, self.detector.probability)
+        # Normalized spectrum, without gain
+        spectrum = self.detector.classifier.predict.call_args[0][0]
+        np.testing.assert_allclose(self.detector.spectrum / 510, spectrum)
+
+    def test_combine_channels_max(self):
+        self.detector.channel_policy = 'max'
+        self.assertEqual(0.7, self.detector.combine_channels(np.array([0.2, 0.7, 0.5])))
+
+    def test_combine_channels_mean(self):
+        self.detector.channel_policy = 'mean'
+        self.assertAlmostEqual(0.3, self.detector.combine_channels(np.array([0.2, 0.6, 0.1])))
+
+    def test_combine_channels_vote(self):
+        self.detector.channel_policy = 'vote'
+        self.detector.channel_votes = 2
+        # Second highest value: above the threshold only if two channels are above it
+        self.assertEqual(0.5, self.detector.combine_channels(np.array([0.2, 0.7, 0.5])))
+
     def test_process_value_not_enough_samples(self):
         # Fast exit if there is not enough samples in the sliding window
         self.sliding_window.__len__.return_value = 1
@@ -89,63 +371,179 @@ class AudioDetectorTestCase(unittest.TestCase):
         self.detector.process_value(0.66)
         self.sliding_window.add.assert_called_once_with(True)
 
-    @patch('ringr.audio.time')
-    def test_analyze_not_detected(self, mock_time):
+    @patch('ringr.audio.time.time', Mock(return_value=1000))
+    def test_detection(self):
+        self.detector.stream_time = 15
+        self.detector.process_value(0.66)
+
+        self.assertEqual(Detection(time=1000, confidence=0.66, rule='frequency:1000'), self.detector.get_detection())
+
+    @patch('ringr.audio.time.time', Mock(return_value=1000))
+    def test_detection_time_of_block(self):
+        # Wall-clock time of the block, not of its analysis
+        self.detector.stream = Mock(time=15.2)
+        self.detector.adc_clock = True
+        self.detector.stream_time = 15
+
+        self.assertAlmostEqual(999.8, self.detector.get_detection().time)
+
+    def test_analyze_not_detected(self):
         self.detector.last_detection_time = 0
         self.detector.last_state = False
-        mock_time.time.return_value = 15
         self.notifier.notify.reset_mock()
 
         self.detector.get_fft_magnitude = Mock()
         self.detector.process_value = Mock(return_value=False)
 
-        self.detector.analyze(self.data)
+        self.detector.analyze(self.data, 15)
 
         self.assertFalse(self.detector.last_state)
         self.notifier.notify.assert_not_called()
 
-    @patch('ringr.audio.time')
-    def test_analyze_detected(self, mock_time):
+    def test_analyze_detected(self):
         self.detector.last_detection_time = 0
         self.detector.last_state = False
-        mock_time.time.return_value = 15
         self.notifier.notify.reset_mock()
 
         self.detector.get_fft_magnitude = Mock()
         self.detector.process_value = Mock(return_value=True)
 
-        self.detector.analyze(self.data)
+        self.detector.analyze(self.data, 15)
 
         self.assertTrue(self.detector.last_state)
         self.assertEqual(15, self.detector.last_detection_time)
-        self.notifier.notify.assert_called_once_with(True)
+        self.notifier.notify.assert_called_once_with(True, ANY, ANY)
 
-    @patch('ringr.audio.time')
-    def test_analyze_cooldown_time(self, mock_time):
+    def test_analyze_cooldown_time(self):
         self.detector.last_detection_time = 0
         self.detector.last_state = True
-        mock_time.time.return_value = 9
         self.notifier.notify.reset_mock()
 
         self.detector.get_fft_magnitude = Mock()
         self.detector.process_value = Mock()
 
-        self.detector.analyze(self.data)
+        self.detector.analyze(self.data, 9)
 
         self.assertTrue(self.detector.last_state)
         self.notifier.notify.assert_not_called()
 
-    @patch('ringr.audio.time')
-    def test_analyze_reset_cooldown_time(self, mock_time):
+    def test_analyze_reset_cooldown_time(self):
         self.detector.last_detection_time = 0
         self.detector.last_state = True
-        mock_time.time.return_value = 16
         self.notifier.notify.reset_mock()
 
         self.detector.get_fft_magnitude = Mock()
         self.detector.process_value = Mock(return_value=False)
 
-        self.detector.analyze(self.data)
+        self.detector.analyze(self.data, 16)
 
         self.assertFalse(self.detector.last_state)
-        self.notifier.notify.assert_called_once_with(False)
+        self.notifier.notify.assert_called_once_with(False, None, None)
+
+    def test_notify_error(self):
+        self.notifier.notify.side_effect = OSError()
+        self.detector.event = Event(start=0, stream_start=0, rule='frequency:1000', peak_magnitude=0.7, hit_ratio=1)
+
+        self.assertFalse(self.detector.notify(True))
+        self.assertFalse(self.detector.event.notified)
+
+    def test_event(self):
+        # The notifier reports the outcome of the detection
+        self.notifier.notify.side_effect = lambda state, detection, callback: callback and callback(True)
+        self.detector.event_store = Mock()
+        self.detector.time_offset = 1000
+        self.detector.stream_time = 15
+        self.detector.num_matches = 27
+        self.detector.confidence = 0.7
+
+        self.detector.update_state(True)
+        self.detector.event.peak_magnitude = 0.9
+        self.detector.stream_time = 26
+        self.detector.update_state(False)
+
+        self.assertIsNone(self.detector.event)
+        self.detector.event_store.add.assert_called_once_with(Event(
+            start=1015, stream_start=15, rule='frequency:1000', peak_magnitude=0.9, hit_ratio=0.9, notified=True,
+            end=1026, stream_end=26))
+
+    def test_event_without_window(self):
+        self.detector.event_store = Mock()
+        self.detector.peak_blocks = 0
+
+        self.detector.update_state(True)
+
+        self.assertIsNone(self.detector.event.hit_ratio)
+
+    def test_event_outcome_unknown(self):
+        self.detector.event_store = Mock()
+
+        self.detector.update_state(True)
+        self.detector.update_state(False)
+
+        self.assertIsNone(self.detector.event_store.add.call_args[0][0].notified)
+
+    def test_event_peak_magnitude(self):
+        self.detector.event = Event(start=0, stream_start=0, rule='frequency:1000', peak_magnitude=0.7, hit_ratio=1)
+        self.detector.last_state = True
+        self.detector.get_fft_magnitude = Mock(return_value=0.8)
+
+        self.detector.analyze(self.data, 1)
+
+        self.assertEqual(0.8, self.detector.event.peak_magnitude)
+
+    @patch('ringr.audio.time')
+    def test_analyze_record(self, mock_time):
+        self.detector.recorder = Mock()
+        self.detector.last_state = False
+        self.detector.num_matches = 7
+        mock_time.time.return_value = 1000
+
+        self.detector.get_fft_magnitude = Mock(return_value=0.5)
+        self.detector.process_value = Mock(return_value=False)
+
+        self.detector.analyze(self.data, 20)
+        self.detector.analyze(self.data, 20.05)
+
+        # Wall-clock time of the first block used as reference for the stream time
+        self.detector.recorder.append.assert_called_with(2, 1000.05, 0.5, 7, False)
+
+    def test_analyze_monitor(self):
+        self.detector.monitor = Mock()
+        self.detector.process_value = Mock(return_value=False)
+
+        self.detector.analyze(self.data, 20)
+
+        magnitudes, magnitude, threshold = self.detector.monitor.publish.call_args[0]
+        self.assertEqual((256, 1), magnitudes.shape)
+        self.assertEqual(0.65, threshold)
+
+    def test_analyze_detection_latency(self):
+        self.notifier.notify.side_effect = lambda state, detection, callback: callback(True)
+        self.detector.stream = Mock(time=15.12)
+        self.detector.adc_clock = True
+        self.detector.last_state = False
+
+        self.detector.get_fft_magnitude = Mock()
+        self.detector.process_value = Mock(return_value=True)
+
+        self.detector.analyze(self.data, 15)
+
+        self.assertAlmostEqual(0.12, self.detector.detection_latency)
+
+    def test_callback_stream_time(self):
+        self.detector.analyze = Mock()
+
+        self.detector.callback(self.data, 2205, Mock(inputBufferAdcTime=123.4), None)
+
+        self.assertTrue(self.detector.adc_clock)
+        self.detector.analyze.assert_called_once_with(self.data, 123.4)
+
+    def test_callback_stream_time_from_frames(self):
+        # Host APIs without timestamps
+        self.detector.analyze = Mock()
+
+        self.detector.callback(self.data, 2205, Mock(inputBufferAdcTime=0), None)
+        self.detector.callback(self.data, 2205, Mock(inputBufferAdcTime=0), None)
+
+        self.assertFalse(self.detector.adc_clock)
+        self.detector.analyze.assert_called_with(self.data, 0.05)
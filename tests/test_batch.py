@@ -0,0 +1,25 @@
+import queue
+import unittest
+
+from ringr.batch import next_batch
+
+
+class NextBatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.queue = queue.Queue()
+
+    def test_batch_size(self):
+        for i in range(5):
+            self.queue.put(i)
+
+        self.assertEqual(([0, 1, 2], False), next_batch(self.queue, 3, 10))
+        self.assertEqual(([3, 4], False), next_batch(self.queue, 3, 0.01))
+
+    def test_closed(self):
+        self.queue.put(0)
+        self.queue.put(None)
+
+        self.assertEqual(([0], True), next_batch(self.queue, 3, 10))
+
+    def test_idle_timeout(self):
+        self.assertEqual(([], False), next_batch(self.queue, 3, 10, idle_timeout=0.01))
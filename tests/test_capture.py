@@ -0,0 +1,184 @@
+import os
+import unittest
+from unittest.mock import Mock, patch
+
+import logging
+
+import numpy as np
+
+from ringr.capture import HEADER_DTYPE, CaptureRing, RingAudioDetector
+from ringr.config import DetectorConfig
+from ringr.exceptions import RingrDetectorError
+
+
+# Don't show logging messages while testing
+logging.disable(logging.CRITICAL)
+
+
+class CaptureRingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.name = f'ringr_test_{os.getpid()}'
+        self.ring = CaptureRing.create(self.name, 44100, 2205, 2, 'int16', slots=4)
+        self.addCleanup(self.ring.close)
+
+        # Attached from the same process: the resource tracker must still see the memory of the owner when it removes it
+        with patch('ringr.capture.resource_tracker.unregister'):
+            self.reader = CaptureRing.attach(self.name)
+        self.addCleanup(self.reader.close)
+
+    def block(self, value):
+        return np.full([2205, 2], value, dtype=np.int16)
+
+    def test_attach(self):
+        self.assertEqual(44100, self.reader.samplerate)
+        self.assertEqual(2205, self.reader.blocksize)
+        self.assertEqual(2, self.reader.channels)
+        self.assertEqual('int16', self.reader.dtype)
+        self.assertEqual(4, self.reader.slots)
+
+    def test_alignment(self):
+        self.assertEqual(0, HEADER_DTYPE.fields['seq'][1] % 8)
+        for array in (self.reader.slot_seq, self.reader.slot_time, self.reader.slot_frames, self.reader.data):
+            self.assertTrue(array.flags.aligned)
+            self.assertEqual(0, array.__array_interface__['data'][0] % 8)
+
+    def test_attach_not_found(self):
+        with self.assertRaises(RingrDetectorError):
+            CaptureRing.attach('ringr_test_missing')
+
+    def test_write_read(self):
+        self.ring.write(self.block(7), 2205, 12.5)
+
+        self.assertEqual(1, self.reader.seq)
+        data, frames, adc_time = self.reader.read(1)
+        np.testing.assert_array_equal(self.block(7), data)
+        self.assertEqual((2205, 12.5), (frames, adc_time))
+
+    def test_read_overwritten(self):
+        for i in range(5):
+            self.ring.write(self.block(i), 2205, i)
+
+        self.assertIsNone(self.reader.read(1))
+        self.assertFalse(self.reader.valid(1))
+        self.assertEqual(4, self.reader.read(5)[2])
+
+    def test_zero_copy(self):
+        self.ring.write(self.block(1), 2205, 0)
+        data, _, _ = self.reader.read(1)
+        self.ring.write(self.block(2), 2205, 0)
+        self.ring.write(self.block(3), 2205, 0)
+        self.ring.write(self.block(4), 2205, 0)
+        self.ring.write(self.block(5), 2205, 0)  # same slot than block 1
+
+        self.assertEqual(5, data[0, 0])
+        del data
+
+
+class RingAudioDetectorTestCase(unittest.TestCase):
+    config = DetectorConfig(
+        device=1,
+        threshold=65,
+        peak_duration=1.5,
+        frequency=1000,
+        gain=200,
+        dtype='int16',
+    )
+
+    def setUp(self):
+        self.ring = Mock(samplerate=44100, blocksize=2205, channels=2, dtype='int16', slots=4, seq=0)
+        self.ring.shm.name = 'ringr_capture'
+        self.ring.valid.return_value = True
+        self.blocks = {}
+        self.ring.read.side_effect = lambda seq: self.blocks.get(seq)
+
+        self.detector = RingAudioDetector(self.config, Mock(), None, self.ring)
+        self.detector.process_block = Mock()
+
+    def write(self, seq):
+        self.blocks[seq] = (np.zeros([2205, 2]), 2205, seq / 20)
+        self.ring.seq = seq
+
+    def test_ring_parameters(self):
+        self.assertEqual(44100, self.detector.samplerate)
+        self.assertEqual('ringr_capture', self.detector.device_name)
+
+    def test_blocksize_mismatch(self):
+        with self.assertRaises(RingrDetectorError):
+            RingAudioDetector(DetectorConfig(device=1, threshold=65, peak_duration=1.5, frequency=1000,
+                                             dtype='int16', block_duration=100), Mock(), None, self.ring)
+
+    def test_read_blocks(self):
+        self.detector.next_seq = 1
+        self.write(1)
+        self.write(2)
+
+        self.assertEqual(2, self.detector.read_blocks())
+        self.assertEqual(2, self.detector.process_block.call_count)
+        self.assertEqual(0, self.detector.read_blocks())
+        self.assertEqual(0, self.detector.overruns)
+
+    def test_overrun(self):
+        self.detector.next_seq = 1
+        for seq in range(1, 7):
+            self.write(seq)
+
+        self.assertEqual(1, self.detector.read_blocks())
+        self.assertEqual(5, self.detector.overruns)
+        self.assertEqual(7, self.detector.next_seq)
+        self.assertEqual(5 * 2205, self.detector.frames)  # The processing of the last block is mocked
+
+    def test_overwritten_while_analyzed(self):
+        self.detector.next_seq = 1
+        self.write(1)
+        self.ring.valid.side_effect = [False, True]
+        self.ring.seq = 3
+        self.blocks[3] = self.blocks[1]
+
+        self.assertEqual(1, self.detector.read_blocks())
+        self.assertEqual(2, self.detector.overruns)
+        self.assertEqual(4, self.detector.next_seq)
+
+    @patch('ringr.capture.CaptureRing.attach')
+    def test_reattach(self, mock_attach):
+        old_ring = self.ring
+        ring = mock_attach.return_value
+        ring.configure_mock(samplerate=44100, blocksize=2205, channels=2, dtype='int16', seq=3)
+
+        self.detector.ring_stalled()
+
+        mock_attach.assert_called_once_with('ringr_capture')
+        old_ring.close.assert_called_once()
+        self.assertIs(ring, self.detector.ring)
+        self.assertEqual(4, self.detector.next_seq)
+        self.assertTrue(self.detector.resync)
+        self.detector.notifier.set_availability.assert_called_once_with(False)
+
+        # Not again until the backoff delay
+        self.detector.ring_stalled()
+        mock_attach.assert_called_once()
+
+    @patch('ringr.capture.CaptureRing.attach')
+    def test_reattach_changed_ring(self, mock_attach):
+        ring = mock_attach.return_value
+        ring.configure_mock(samplerate=44100, blocksize=4410, channels=2, dtype='int16', seq=3)
+
+        self.detector.reattach()
+
+        ring.close.assert_called_once()
+        self.assertIs(self.ring, self.detector.ring)
+
+    @patch('ringr.capture.CaptureRing.attach', Mock(side_effect=RingrDetectorError('Capture ring not found')))
+    def test_reattach_not_found(self):
+        self.detector.reattach()
+
+        self.assertIs(self.ring, self.detector.ring)
+        self.ring.close.assert_not_called()
+
+    def test_resumed(self):
+        self.detector.next_seq = 1
+        self.detector.available = False
+        self.write(1)
+
+        self.detector.read_blocks()
+
+        self.detector.notifier.set_availability.assert_called_once_with(True)
@@ -0,0 +1,77 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from ringr.classifier import SoundClassifier, mel_filterbank, train
+from ringr.exceptions import RingrDetectorError
+
+from helpers import write_wav
+
+
+class ClassifierTestCase(unittest.TestCase):
+    samplerate = 44100
+    fftsize = 510
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name)
+        self.rng = np.random.default_rng(1)
+
+    def chime(self, duration=1):
+        t = np.arange(int(self.samplerate * duration)) / self.samplerate
+        return 0.2 * np.sin(2 * np.pi * 1300 * t) + 0.1 * np.sin(2 * np.pi * 2600 * t) + self.noise(duration, 0.01)
+
+    def noise(self, duration=1, amplitude=0.1):
+        return self.rng.normal(0, amplitude, int(self.samplerate * duration))
+
+    def spectra(self, samples):
+        frames = samples[:len(samples) // self.fftsize * self.fftsize].reshape(-1, self.fftsize)
+        return np.abs(np.fft.rfft(frames, axis=1)).T / self.fftsize
+
+    def train(self):
+        write_wav(self.path / 'chime.wav', self.chime(), self.samplerate)
+        write_wav(self.path / 'noise.wav', self.noise(), self.samplerate)
+        return train([self.path / 'chime.wav'], [self.path / 'noise.wav'], self.samplerate, self.fftsize,
+                     num_mels=20)
+
+    def test_mel_filterbank(self):
+        filterbank = mel_filterbank(self.samplerate, self.fftsize, 40)
+
+        self.assertEqual((40, 256), filterbank.shape)
+        self.assertTrue((filterbank <= 1).all())
+        # Each filter covers some bins
+        self.assertTrue((filterbank.sum(axis=1) > 0).all())
+
+    def test_train(self):
+        classifier, accuracy = self.train()
+
+        self.assertGreater(accuracy, 0.95)
+        self.assertTrue((classifier.predict(self.spectra(self.chime())) > 0.5).all())
+        self.assertTrue((classifier.predict(self.spectra(self.noise())) < 0.5).all())
+
+    def test_predict_channels(self):
+        classifier, _ = self.train()
+        spectra = np.stack([self.spectra(self.chime())[:, 0], self.spectra(self.noise())[:, 0]], axis=1)
+
+        probability = classifier.predict(spectra)
+        self.assertEqual((2,), probability.shape)
+        self.assertGreater(probability[0], 0.5)
+        self.assertLess(probability[1], 0.5)
+
+    def test_save_load(self):
+        classifier, _ = self.train()
+        classifier.save(self.path / 'model.npz')
+
+        loaded = SoundClassifier.load(self.path / 'model.npz', self.samplerate, self.fftsize)
+        spectra = self.spectra(self.chime(0.1))
+        np.testing.assert_allclose(classifier.predict(spectra), loaded.predict(spectra))
+
+    def test_load_other_fftsize(self):
+        classifier, _ = self.train()
+        classifier.save(self.path / 'model.npz')
+
+        with self.assertRaises(RingrDetectorError):
+            SoundClassifier.load(self.path / 'model.npz', self.samplerate, 1024)
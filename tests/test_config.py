@@ -108,3 +108,60 @@ class ConfigTestCase(unittest.TestCase):
             log_analysis=False
         )
         self.assertEqual(expected, detector_config)
+
+    @patch.dict('os.environ', {'RINGR_DETECTOR_CHANNELS': '0,2,3'}, clear=True)
+    def test_channels(self):
+        parser = EnvConfigParser()
+        parser.read_dict({
+            'detector': {
+                'device': '1',
+                'threshold': '60',
+                'peak_duration': '0.8',
+                'frequency': '1000',
+                'channel_policy': 'vote',
+                'channel_votes': '2',
+            }
+        })
+
+        detector_config = DetectorConfig.configure(parser)
+        self.assertEqual((0, 2, 3), detector_config.channels)
+        self.assertEqual('vote', detector_config.channel_policy)
+        self.assertEqual(2, detector_config.channel_votes)
+
+    @patch.dict('os.environ', {}, clear=True)
+    def test_sequence(self):
+        parser = EnvConfigParser()
+        parser.read_dict({
+            'detector': {
+                'device': '1',
+                'threshold': '60',
+                'peak_duration': '0.8',
+                'mode': 'sequence',
+                'sequence': '1300:0.4, 1000:0.6',
+                'sequence_gap': '0.3',
+            }
+        })
+
+        detector_config = DetectorConfig.configure(parser)
+        self.assertEqual('sequence', detector_config.mode)
+        self.assertEqual(((1300, 0.4), (1000, 0.6)), detector_config.sequence)
+        self.assertEqual(0.3, detector_config.sequence_gap)
+        self.assertEqual(0.5, detector_config.sequence_tolerance)
+        self.assertEqual(0, detector_config.frequency)
+
+    @patch.dict('os.environ', {}, clear=True)
+    def test_device_name(self):
+        parser = EnvConfigParser()
+        parser.read_dict({
+            'detector': {
+                'device': 'USB PnP Sound Device',
+                'threshold': '60',
+                'peak_duration': '0.8',
+                'frequency': '1000',
+                'watchdog': '1',
+            }
+        })
+
+        detector_config = DetectorConfig.configure(parser)
+        self.assertEqual('USB PnP Sound Device', detector_config.device)
+        self.assertEqual(1, detector_config.watchdog)
@@ -0,0 +1,113 @@
+import json
+import unittest
+from unittest.mock import Mock, patch
+
+import logging
+
+from ringr.notifiers import Detection
+from ringr.notifiers.election import Election
+
+
+# Don't show logging messages while testing
+logging.disable(logging.CRITICAL)
+
+
+class ElectionTestCase(unittest.TestCase):
+    def setUp(self):
+        timer_patcher = patch('ringr.notifiers.election.threading.Timer')
+        self.mock_timer = timer_patcher.start()
+        self.addCleanup(timer_patcher.stop)
+
+        self.mqtt = Mock()
+        self.election = Election(self.mqtt, 'ringr/election/hall', 'ringr_01', window=0.4, qos=1)
+        self.callback = Mock()
+
+    def candidate(self, node, time, confidence):
+        return json.dumps({'node': node, 'time': time, 'confidence': confidence}).encode()
+
+    def close(self, time, confidence):
+        self.election.run(Detection(time, confidence), self.callback)
+        # Close the election as the timer would do
+        _, close, args = self.mock_timer.call_args[0]
+        close(*args)
+
+    def test_run(self):
+        self.election.run(Detection(1000.5, 0.8), self.callback)
+
+        self.mqtt.publish.assert_called_once_with(
+            'ringr/election/hall', payload='{"node": "ringr_01", "time": 1000.5, "confidence": 0.8}', qos=1)
+        self.assertEqual(0.4, self.mock_timer.call_args[0][0])
+        self.mock_timer.return_value.start.assert_called_once()
+
+    def test_cancel(self):
+        self.election.run(Detection(1000, 0.8), self.callback)
+        self.election.cancel()
+
+        self.mock_timer.return_value.cancel.assert_called_once()
+        self.assertIsNone(self.election.timer)
+
+    @patch('ringr.notifiers.election.time.time', Mock(return_value=1000))
+    def test_win_without_other_candidates(self):
+        self.close(1000, 0.5)
+
+        self.callback.assert_called_once_with(True)
+
+    @patch('ringr.notifiers.election.time.time', Mock(return_value=1000))
+    def test_lose_lower_confidence(self):
+        self.election.receive(self.candidate('ringr_02', 1000.1, 0.9))
+        self.close(1000, 0.5)
+
+        self.callback.assert_called_once_with(False)
+
+    @patch('ringr.notifiers.election.time.time', Mock(return_value=1000))
+    def test_win_higher_confidence(self):
+        self.election.receive(self.candidate('ringr_02', 999.9, 0.4))
+        self.close(1000, 0.5)
+
+        self.callback.assert_called_once_with(True)
+
+    @patch('ringr.notifiers.election.time.time', Mock(return_value=1000))
+    def test_tie_earliest_detection(self):
+        self.election.receive(self.candidate('ringr_02', 999.9, 0.5))
+        self.close(1000, 0.5)
+
+        self.callback.assert_called_once_with(False)
+
+    @patch('ringr.notifiers.election.time.time', Mock(return_value=1000))
+    def test_candidate_of_another_event(self):
+        self.election.receive(self.candidate('ringr_02', 999.7, 0.9))
+        self.close(1000, 0.5)
+
+        self.callback.assert_called_once_with(True)
+
+    @patch('ringr.notifiers.election.time.time', Mock(return_value=1000))
+    def test_candidate_of_previous_event(self):
+        # Both candidates belong to the event started by ringr_02 at 999.7
+        self.election.receive(self.candidate('ringr_02', 999.7, 0.4))
+        self.election.receive(self.candidate('ringr_03', 999.85, 0.9))
+        self.close(1000, 0.5)
+
+        self.callback.assert_called_once_with(True)
+
+    def test_group_is_the_same_for_every_node(self):
+        a, b, c = ('a', 0, 0.5), ('b', 0.14, 0.6), ('c', 0.28, 0.9)
+
+        # Window of 0.3 s: a and b are the first event, c starts the next one
+        self.assertEqual([a, b], Election.group([a, b, c], a, 0.15))
+        self.assertEqual([a, b], Election.group([a, b, c], b, 0.15))
+        self.assertEqual([c], Election.group([a, b, c], c, 0.15))
+
+    @patch('ringr.notifiers.election.time.time', Mock(return_value=1000))
+    def test_ignore_own_and_invalid_candidates(self):
+        self.election.receive(self.candidate('ringr_01', 1000, 0.9))
+        self.election.receive(b'{"node": "ringr_02"}')
+        self.election.receive(b'invalid')
+
+        self.assertEqual([], self.election.received)
+
+    @patch('ringr.notifiers.election.time.time', Mock(return_value=1000))
+    def test_discard_old_candidates(self):
+        self.election.receive(self.candidate('ringr_02', 990, 0.9))
+        self.election.receive(self.candidate('ringr_03', 1000, 0.9))
+
+        self.assertEqual([('ringr_03', 1000, 0.9)], self.election.received)
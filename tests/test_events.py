@@ -0,0 +1,107 @@
+import time
+import sqlite3
+import unittest
+import tempfile
+from pathlib import Path
+
+import logging
+
+from ringr.events import Event, EventStore, query_events
+
+
+# Don't show logging messages while testing
+logging.disable(logging.CRITICAL)
+
+
+class EventStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name) / 'events.db'
+
+    def event(self, start, rule='frequency:1000', notified=True):
+        return Event(start=start, stream_start=start - 1000, rule=rule, peak_magnitude=0.8, hit_ratio=0.95,
+                     notified=notified, end=start + 10, stream_end=start - 990)
+
+    def test_store(self):
+        store = EventStore(self.path)
+        store.add(self.event(time.time()))
+        store.add(self.event(time.time(), notified=None))
+        store.close()
+
+        events = query_events(self.path)
+        self.assertEqual(2, len(events))
+        self.assertEqual('frequency:1000', events[0]['rule'])
+        self.assertEqual(0.8, events[0]['peak_magnitude'])
+        self.assertEqual(1, events[0]['notified'])
+        self.assertIsNone(events[1]['notified'])
+
+    def test_wal_mode(self):
+        EventStore(self.path).close()
+
+        with sqlite3.connect(self.path) as db:
+            self.assertEqual('wal', db.execute('PRAGMA journal_mode').fetchone()[0])
+
+    def test_batch(self):
+        store = EventStore(self.path, batch_size=3, flush_interval=10)
+        for _ in range(3):
+            store.add(self.event(time.time()))
+
+        # Written without waiting for the flush interval
+        events = []
+        for _ in range(100):
+            time.sleep(0.01)
+            try:
+                events = query_events(self.path)
+            except sqlite3.OperationalError:
+                continue  # not created yet
+            if len(events) == 3:
+                break
+        self.assertEqual(3, len(events))
+        store.close()
+
+    def test_prune(self):
+        now = time.time()
+        store = EventStore(self.path, retention_days=1)
+        store.add(self.event(now - 2 * 86400))
+        store.add(self.event(now))
+        store.close()
+
+        # Old events are removed when the store is opened again
+        EventStore(self.path, retention_days=1).close()
+
+        events = query_events(self.path)
+        self.assertEqual([now], [event['start'] for event in events])
+
+    def test_prune_while_idle(self):
+        store = EventStore(self.path, retention_days=1)
+        store.prune_interval = 0.05
+        store.add(self.event(time.time() - 2 * 86400))
+
+        # Removed without any other event waking up the writer
+        events = [None]
+        for _ in range(100):
+            time.sleep(0.01)
+            try:
+                events = query_events(self.path)
+            except sqlite3.OperationalError:
+                continue  # not created yet
+            if not events:
+                break
+        self.assertEqual([], events)
+        store.close()
+
+    def test_query(self):
+        now = time.time()
+        store = EventStore(self.path)
+        store.add(self.event(now - 2000))
+        store.add(self.event(now - 1000, rule='template:doorbell.wav'))
+        store.add(self.event(now))
+        store.close()
+
+        def starts(**kwargs):
+            return [event['start'] for event in query_events(self.path, **kwargs)]
+
+        self.assertEqual([now - 1000, now], starts(start=now - 1000))
+        self.assertEqual([now - 2000], starts(end=now - 1000))
+        self.assertEqual([now - 1000], starts(rule='template:doorbell.wav'))
@@ -0,0 +1,65 @@
+import time
+import unittest
+
+import numpy as np
+
+from ringr.features import (FeatureFrame, encode_frame, decode_frame, downsample, quantize, band_index,
+                            UDPFeaturePublisher, UDPFeatureReceiver)
+from ringr.exceptions import RingrDetectorError
+
+
+class FeaturesTestCase(unittest.TestCase):
+
+    def test_encode_decode(self):
+        frame = FeatureFrame('kitchen', 12, 34.5, 44100, 510, np.arange(64, dtype=np.uint8))
+
+        packet = encode_frame(frame)
+        self.assertEqual(24 + 7 + 64, len(packet))
+
+        decoded = decode_frame(packet)
+        self.assertEqual('kitchen', decoded.node_id)
+        self.assertEqual(12, decoded.block)
+        self.assertEqual(34.5, decoded.stream_time)
+        self.assertEqual(44100, decoded.samplerate)
+        self.assertEqual(510, decoded.fftsize)
+        np.testing.assert_array_equal(np.arange(64), decoded.bands)
+
+    def test_decode_invalid(self):
+        packet = encode_frame(FeatureFrame('kitchen', 12, 34.5, 44100, 510, np.zeros(64, dtype=np.uint8)))
+
+        with self.assertRaises(RingrDetectorError):
+            decode_frame(packet[:-1])
+        with self.assertRaises(RingrDetectorError):
+            decode_frame(b'XX' + packet[2:])
+        with self.assertRaises(RingrDetectorError):
+            decode_frame(b'RG')
+
+    def test_downsample(self):
+        np.testing.assert_array_equal([3, 5, 6], downsample(np.array([1, 3, 5, 2, 6]), 3))
+
+    def test_quantize(self):
+        np.testing.assert_array_equal([0, 127, 255, 255], quantize(np.array([-1, 0.5, 1, 2])))
+
+    def test_band_index(self):
+        # 1000 Hz is in the bin 12 of 256 bins, 4 bins per band
+        self.assertEqual(3, band_index(1000, 44100, 510, 64))
+        self.assertEqual(63, band_index(30000, 44100, 510, 64))
+
+    def test_udp_transport(self):
+        receiver = UDPFeatureReceiver('127.0.0.1', 0)
+        self.addCleanup(receiver.socket.close)
+        receiver.start()
+
+        publisher = UDPFeaturePublisher('127.0.0.1', receiver.socket.getsockname()[1], 'kitchen', 44100, 510)
+        self.addCleanup(publisher.close)
+        publisher.publish(1, 0.05, np.array([0.0, 0.5, 1.0]))
+
+        for _ in range(100):
+            packets = receiver.drain()
+            if packets:
+                break
+            time.sleep(0.01)
+
+        frame = decode_frame(packets[0])
+        self.assertEqual('kitchen', frame.node_id)
+        np.testing.assert_array_equal([0, 127, 255], frame.bands)
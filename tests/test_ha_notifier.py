@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import Mock, patch, call
+from unittest.mock import Mock, ANY, patch, call
 
 import logging
 
@@ -7,6 +7,7 @@ import paho.mqtt.client as paho
 from paho.mqtt.client import MQTTMessage
 
 from ringr import __version__
+from ringr.notifiers import Detection
 from ringr.notifiers.ha_notifier import HANotifier, HANotifierConfig
 
 
@@ -86,6 +87,21 @@ class HANotifierTestCase(unittest.TestCase):
 
         self.mqtt.username_pw_set.assert_not_called()
 
+    def test_message_while_connecting(self):
+        # Retained status of Home Assistant, received as soon as the network loop starts
+        msg = MQTTMessage()
+        msg.topic = b'homeassistant/status'
+        msg.payload = b'online'
+        self.mqtt.loop_start.side_effect = lambda: self.mqtt.on_message(self.mqtt, None, msg)
+        self.mqtt.publish.reset_mock()
+
+        HANotifier(self.config)
+
+        # Sent again for the status message, without stopping the network thread of the client
+        config_message = call('homeassistant/binary_sensor/ringr_01/config', payload=self.config_payload, qos=1,
+                              retain=True)
+        self.assertEqual([config_message, config_message], self.mqtt.publish.call_args_list)
+
     def test_on_connect_accepted(self):
         self.notifier._on_mqtt_connect(None, None, None, 0)
 
@@ -135,6 +151,52 @@ class HANotifierTestCase(unittest.TestCase):
 
         self.mqtt.publish.assert_called_with(expected_topic, payload=expected_payload, qos=1, retain=True)
 
+    def test_notify_outcome_on_puback(self):
+        self.mock_paho.MQTT_ERR_SUCCESS = paho.MQTT_ERR_SUCCESS
+        self.mqtt.publish.return_value = Mock(rc=paho.MQTT_ERR_SUCCESS, mid=7)
+        callback = Mock()
+
+        self.notifier.notify(True, callback=callback)
+        callback.assert_not_called()
+
+        self.notifier._on_mqtt_publish(None, None, 7)
+        callback.assert_called_once_with(True)
+
+    def test_notify_outcome_acknowledged_before_tracked(self):
+        self.mock_paho.MQTT_ERR_SUCCESS = paho.MQTT_ERR_SUCCESS
+        self.mqtt.publish.return_value = Mock(rc=paho.MQTT_ERR_SUCCESS, mid=7)
+        callback = Mock()
+
+        # PUBACK handled by the network thread before publish returns
+        self.notifier._on_mqtt_publish(None, None, 7)
+        self.notifier.notify(True, callback=callback)
+
+        callback.assert_called_once_with(True)
+
+    def test_notify_outcome_lost(self):
+        config = HANotifierConfig(type='ha', mqtt_host='localhost', mqtt_qos=0)
+        self.notifier = HANotifier(config)
+        self.mock_paho.MQTT_ERR_NO_CONN = paho.MQTT_ERR_NO_CONN
+        self.mqtt.publish.return_value = Mock(rc=paho.MQTT_ERR_NO_CONN, mid=7)
+        callback = Mock()
+
+        self.notifier.notify(True, callback=callback)
+
+        callback.assert_called_once_with(False)
+
+    def test_set_availability(self):
+        self.notifier.set_availability(False)
+
+        expected_topic = 'homeassistant/binary_sensor/ringr_01/availability'
+        self.mqtt.publish.assert_called_with(expected_topic, payload=b'offline', qos=1, retain=True)
+
+    def test_unavailable_on_connect(self):
+        self.notifier.available = False
+        self.notifier._on_mqtt_connect(None, None, None, 0)
+
+        expected_topic = 'homeassistant/binary_sensor/ringr_01/availability'
+        self.mqtt.publish.assert_called_with(expected_topic, payload=b'offline', qos=1, retain=True)
+
     def test_resend_discovery_config_message_on_ha_birth_message(self):
         msg = MQTTMessage()
         msg.topic = b'homeassistant/status'
@@ -151,3 +213,78 @@ class HANotifierTestCase(unittest.TestCase):
             call(expected_topic, payload=expected_payload, qos=1, retain=True),
             call(expected_topic, payload=expected_payload, qos=1, retain=True),
         ])
+
+
+class HANotifierElectionTestCase(unittest.TestCase):
+    config = HANotifierConfig(
+        type='ha',
+        device_id='ringr_01',
+        mqtt_host='localhost',
+        dedup_group='hall',
+        dedup_window=0.2,
+    )
+
+    def setUp(self):
+        paho_patcher = patch('ringr.notifiers.ha_notifier.paho')
+        self.mock_paho = paho_patcher.start()
+        self.addCleanup(paho_patcher.stop)
+
+        election_patcher = patch('ringr.notifiers.ha_notifier.Election')
+        self.mock_election = election_patcher.start()
+        self.addCleanup(election_patcher.stop)
+        self.election = self.mock_election.return_value
+        self.election.topic = 'ringr/election/hall'
+
+        self.mqtt = Mock()
+        self.mqtt.subscribe = Mock(return_value=(paho.MQTT_ERR_SUCCESS, 0))
+        self.mock_paho.Client = Mock(return_value=self.mqtt)
+
+        with patch('ringr.notifiers.ha_notifier.threading'):
+            self.notifier = HANotifier(self.config)
+        self.mqtt.publish.reset_mock()
+
+    def test_subscribed_to_election_topic(self):
+        self.mock_election.assert_called_once_with(self.mqtt, 'ringr/election/hall', 'ringr_01', 0.2, 1)
+        self.mqtt.subscribe.assert_called_with('ringr/election/hall')
+
+    def test_receive_candidate(self):
+        msg = MQTTMessage()
+        msg.topic = b'ringr/election/hall'
+        msg.payload = b'candidate'
+
+        self.notifier._on_mqtt_message(None, None, msg)
+
+        self.election.receive.assert_called_once_with(b'candidate')
+
+    def test_notify_detected_waits_for_election(self):
+        detection = Detection(1000, 0.8)
+        self.notifier.notify(True, detection)
+
+        self.election.run.assert_called_once_with(detection, ANY)
+        self.mqtt.publish.assert_not_called()
+
+    def test_election_won(self):
+        self.notifier.notify(True, Detection(1000, 0.8))
+        self.notifier._on_election(True)
+        self.notifier.notify(False)
+
+        topic = 'homeassistant/binary_sensor/ringr_01/state'
+        self.mqtt.publish.assert_has_calls([
+            call(topic, payload=b'ON', qos=1, retain=True),
+            call(topic, payload=b'OFF', qos=1, retain=True),
+        ])
+
+    def test_election_lost(self):
+        self.notifier.notify(True, Detection(1000, 0.8))
+        self.notifier._on_election(False)
+        self.notifier.notify(False)
+
+        self.mqtt.publish.assert_not_called()
+        self.election.cancel.assert_called_once()
+
+    def test_election_lost_outcome(self):
+        callback = Mock()
+        self.notifier.notify(True, Detection(1000, 0.8), callback)
+        self.election.run.call_args[0][1](False)
+
+        callback.assert_called_once_with(False)
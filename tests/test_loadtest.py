@@ -0,0 +1,42 @@
+import unittest
+
+import logging
+
+from loadtest import run_ha, run_telegram
+
+
+# Don't show logging messages while testing
+logging.disable(logging.CRITICAL)
+
+
+class LoadTestCase(unittest.TestCase):
+    """ Short runs of the load-test harness against the local MQTT broker and Telegram API stand-ins """
+
+    def test_ha_burst(self):
+        report = run_ha(200)
+
+        self.assertEqual(200, report.received)
+        self.assertEqual(0, report.lost)
+        self.assertEqual(0, report.duplicates)
+        self.assertEqual(200, len(report.latencies))
+
+    def test_ha_slow_puback(self):
+        report = run_ha(50, puback_delay=0.02)
+
+        self.assertEqual(0, report.lost)
+        # The in-flight window of the client holds back the messages waiting for their PUBACK
+        self.assertGreater(report.percentile(100), 20)
+
+    def test_ha_broker_restart(self):
+        report = run_ha(40, rate=200, restart_after=20)
+
+        # QoS 1 messages published while disconnected are sent again after reconnecting
+        self.assertEqual(0, report.lost)
+        self.assertEqual(40, report.received)
+
+    def test_telegram(self):
+        report = run_telegram(50)
+
+        self.assertEqual(50, report.received)
+        self.assertEqual(0, report.lost)
+        self.assertGreater(report.throughput, 0)
@@ -0,0 +1,110 @@
+import json
+import socket
+import unittest
+
+import logging
+
+import numpy as np
+
+from ringr.monitor import SpectrumMonitor, websocket_accept, websocket_frame
+
+
+# Don't show logging messages while testing
+logging.disable(logging.CRITICAL)
+
+
+class SpectrumMonitorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # 20 blocks per second decimated to 10 frames per second
+        self.monitor = SpectrumMonitor('127.0.0.1', 0, fps=10, num_bins=4, block_rate=20, scale=0.5,
+                                       info={'mode': 'frequency'})
+        self.magnitudes = np.array([[0.2, 1.0], [0.4, 0.0], [2.0, 0.0], [0.0, 0.0], [0.6, 0.8], [0.0, 0.0],
+                                    [1.0, 0.0], [0.0, 0.2]])
+
+    def connect(self):
+        self.monitor.start()
+        self.addCleanup(self.monitor.stop)
+
+        client = socket.create_connection(('127.0.0.1', self.monitor.port), timeout=2)
+        self.addCleanup(client.close)
+        return client
+
+    def websocket(self):
+        client = self.connect()
+        client.sendall(b'GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                       b'Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n')
+        response = b''
+        while b'\r\n\r\n' not in response:
+            response += client.recv(1)
+        self.assertIn(b'101 Switching Protocols', response)
+        self.assertIn(b'Sec-WebSocket-Accept: s3pPLMBiTxaQ9kYGzzhZRbK+xOo=', response)
+        return client
+
+    def receive(self, client):
+        head = self.read(client, 2)
+        length = head[1] & 0x7F
+        if length == 126:
+            length = int.from_bytes(self.read(client, 2), 'big')
+        return head[0] & 0x0F, self.read(client, length)
+
+    @staticmethod
+    def read(client, size):
+        data = b''
+        while len(data) < size:
+            data += client.recv(size - len(data))
+        return data
+
+    def test_websocket_accept(self):
+        # Example of RFC 6455
+        self.assertEqual('s3pPLMBiTxaQ9kYGzzhZRbK+xOo=', websocket_accept('dGhlIHNhbXBsZSBub25jZQ=='))
+
+    def test_websocket_frame(self):
+        self.assertEqual(b'\x82\x03abc', websocket_frame(b'abc'))
+        self.assertEqual(b'\x81\x7e\x01\x00', websocket_frame(b'a' * 256, opcode=1)[:4])
+
+    def test_encode(self):
+        frame = self.monitor.encode(self.magnitudes, np.array([0.5, 1.5]), 0.6)
+
+        # Number of values, threshold, values and spectrum (peak of each pair of bins, scaled by 0.5)
+        self.assertEqual(bytes([2, 153, 127, 255, 127, 255, 102, 127]), frame)
+
+    def test_publish_without_clients(self):
+        self.monitor.loop = None  # not started, it would fail if used
+        self.monitor.publish(self.magnitudes, 0.5, 0.6)
+        self.monitor.publish(self.magnitudes, 0.5, 0.6)
+
+    def test_index_page(self):
+        client = self.connect()
+        client.sendall(b'GET / HTTP/1.1\r\nHost: localhost\r\n\r\n')
+
+        response = b''
+        while chunk := client.recv(4096):
+            response += chunk
+        self.assertTrue(response.startswith(b'HTTP/1.1 200 OK'))
+        self.assertIn(b'<canvas', response)
+
+    def test_stream_frames(self):
+        client = self.websocket()
+
+        opcode, payload = self.receive(client)
+        self.assertEqual(1, opcode)
+        self.assertEqual({'mode': 'frequency', 'fps': 10}, json.loads(payload))
+
+        # Only one of each two blocks is sent. Clients only keep the latest frame, so wait for each one
+        for value in (0.1, 0.2):
+            self.monitor.publish(self.magnitudes, value, 0.6)
+        self.assertEqual(51, self.receive(client)[1][2])  # 0.2 * 255 quantized
+
+        for value in (0.3, 0.4):
+            self.monitor.publish(self.magnitudes, value, 0.6)
+        self.assertEqual(102, self.receive(client)[1][2])  # 0.4 * 255 quantized
+
+    def test_port_in_use(self):
+        server = socket.create_server(('127.0.0.1', 0))
+        self.addCleanup(server.close)
+        monitor = SpectrumMonitor('127.0.0.1', server.getsockname()[1], fps=10, num_bins=4, block_rate=20, scale=0.5,
+                                  info={})
+
+        with self.assertRaises(OSError):
+            monitor.start()
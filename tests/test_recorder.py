@@ -0,0 +1,69 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from ringr.recorder import FlightRecorder, read_records, list_segments
+
+
+class FlightRecorderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name)
+
+        self.recorder = FlightRecorder(self.path, segment_size=10, max_segments=3)
+
+    def append(self, num_records, num_values=1):
+        for i in range(1, num_records + 1):
+            self.recorder.append(i, 100 + i, [i / 100] * num_values, i % 5, i % 2 == 0)
+
+    def test_append(self):
+        self.append(5)
+
+        records = read_records(self.path)
+        self.assertEqual(5, len(records))
+        np.testing.assert_array_equal([1, 2, 3, 4, 5], records['block'])
+        np.testing.assert_array_equal([101, 102, 103, 104, 105], records['time'])
+        np.testing.assert_allclose([[0.01], [0.02], [0.03], [0.04], [0.05]], records['magnitude'])
+        np.testing.assert_array_equal([1, 2, 3, 4, 0], records['hits'])
+        np.testing.assert_array_equal([0, 1, 0, 1, 0], records['state'])
+
+    def test_magnitude_per_rule(self):
+        self.append(3, num_values=2)
+
+        records = read_records(self.path)
+        self.assertEqual((3, 2), records['magnitude'].shape)
+
+    def test_rotate_segments(self):
+        self.append(35)
+
+        # 4 segments created, oldest one removed
+        segments = list_segments(self.path)
+        self.assertEqual(['0000000001.npy', '0000000002.npy', '0000000003.npy'], [file.name for file in segments])
+
+        records = read_records(self.path)
+        self.assertEqual(25, len(records))
+        self.assertEqual(11, records['block'][0])
+        self.assertEqual(35, records['block'][-1])
+
+    def test_read_time_range(self):
+        self.append(25)
+
+        records = read_records(self.path, start=108, end=112.5)
+        np.testing.assert_array_equal([8, 9, 10, 11, 12], records['block'])
+
+    def test_read_ignores_different_record_layout(self):
+        self.append(5)
+        self.recorder.close()
+
+        self.recorder = FlightRecorder(self.path, segment_size=10, max_segments=3)
+        self.append(3, num_values=2)
+
+        records = read_records(self.path)
+        self.assertEqual(3, len(records))
+
+    def test_read_empty(self):
+        self.assertEqual(0, len(read_records(self.path)))
@@ -0,0 +1,142 @@
+import asyncio
+import unittest
+from dataclasses import replace
+from unittest.mock import ANY, Mock, MagicMock, AsyncMock, patch, call
+
+import logging
+
+import numpy as np
+
+from ringr.config import DetectorConfig
+from ringr.runtime import AsyncAudioDetector, AsyncRuntime
+
+
+# Don't show logging messages while testing
+logging.disable(logging.CRITICAL)
+
+
+class AsyncRuntimeTestCase(unittest.IsolatedAsyncioTestCase):
+    config = DetectorConfig(
+        device=1,
+        threshold=65,
+        peak_duration=1.5,
+        frequency=1000,
+        gain=200,
+    )
+
+    def setUp(self):
+        self.notifier = Mock()
+        self.notifier.notify_async = AsyncMock()
+
+        AsyncAudioDetector.get_samplerate = Mock(return_value=44100)
+        AsyncAudioDetector.get_device_name = Mock(return_value='USB mic')
+
+        self.detector = AsyncAudioDetector(self.config, self.notifier)
+        self.detector.open_stream = MagicMock()
+
+        self.data = np.full([2205, 1], 0.5)
+
+    async def test_initial_state_notified_synchronously(self):
+        self.notifier.notify.assert_called_once_with(False, None, None)
+        self.notifier.notify_async.assert_not_called()
+
+    async def test_callback_enqueues_block(self):
+        queue = asyncio.Queue()
+        self.detector.attach(asyncio.get_running_loop(), queue)
+
+        self.detector.callback(self.data, 2205, Mock(inputBufferAdcTime=12.5), None)
+        detector, data, frames, adc_time = await asyncio.wait_for(queue.get(), 1)
+
+        self.assertIs(self.detector, detector)
+        self.assertIsNot(self.data, data)  # copied
+        np.testing.assert_array_equal(self.data, data)
+        self.assertEqual(2205, frames)
+        self.assertEqual(12.5, adc_time)
+
+    async def test_callback_queue_full(self):
+        queue = asyncio.Queue(1)
+        self.detector.attach(asyncio.get_running_loop(), queue)
+
+        self.detector.callback(self.data, 2205, Mock(inputBufferAdcTime=0), None)
+        self.detector.callback(self.data, 2205, Mock(inputBufferAdcTime=0), None)
+        await asyncio.sleep(0)
+
+        self.assertEqual(1, queue.qsize())
+        self.assertEqual(2205, self.detector.frames)
+
+    @patch('ringr.audio.time.time', Mock(return_value=1010.2))
+    async def test_notify_async(self):
+        self.detector.attach(asyncio.get_running_loop(), asyncio.Queue())
+        self.detector.stream = Mock(time=10.2)
+        self.detector.adc_clock = True
+        self.detector.stream_time = 10
+        self.detector.confidence = 0.8
+        self.notifier.notify_async.side_effect = lambda state, detection, callback: callback(True)
+
+        self.detector.notify(True)
+        await asyncio.gather(*self.detector.tasks)
+
+        self.notifier.notify_async.assert_awaited_once_with(True, ANY, ANY)
+        detection = self.notifier.notify_async.await_args[0][1]
+        self.assertAlmostEqual(1010, detection.time)
+        self.assertEqual((0.8, 'frequency:1000'), (detection.confidence, detection.rule))
+        self.assertAlmostEqual(0.2, self.detector.detection_latency)
+
+    async def test_notify_async_error(self):
+        self.detector.attach(asyncio.get_running_loop(), asyncio.Queue())
+        self.notifier.notify_async.side_effect = OSError()
+
+        self.detector.notify(True)
+        await asyncio.gather(*self.detector.tasks)
+
+        self.assertIsNone(self.detector.detection_latency)
+
+    async def test_run(self):
+        runtime = AsyncRuntime([self.detector])
+        self.detector.process_block = Mock(side_effect=lambda *args: runtime.stop())
+
+        main = asyncio.create_task(runtime.main())
+        await asyncio.sleep(0)
+        self.detector.callback(self.data, 2205, Mock(inputBufferAdcTime=1), None)
+        await asyncio.wait_for(main, 1)
+
+        self.detector.open_stream.assert_called_once_with(self.detector.callback)
+        self.detector.open_stream.return_value.start.assert_called_once()
+        self.detector.open_stream.return_value.close.assert_called_once_with(ignore_errors=True)
+        self.detector.process_block.assert_called_once()
+
+    @patch('ringr.runtime.reinitialize_portaudio')
+    async def test_watchdog(self, mock_reinitialize):
+        detector = AsyncAudioDetector(replace(self.config, watchdog=0.2), self.notifier)
+        detector.open_stream = MagicMock()
+        detector.open_stream.return_value.active = False  # e.g. device unplugged
+        runtime = AsyncRuntime([detector])
+
+        main = asyncio.create_task(runtime.main())
+        await asyncio.sleep(0.15)
+        runtime.stop()
+        await asyncio.wait_for(main, 1)
+
+        # Reopened by name, without reinitializing PortAudio
+        self.assertEqual(2, detector.open_stream.call_count)
+        self.assertEqual('USB mic', detector.device)
+        mock_reinitialize.assert_not_called()
+        self.notifier.set_availability.assert_has_calls([call(False), call(True)])
+
+    @patch('ringr.runtime.reinitialize_portaudio')
+    async def test_watchdog_backoff(self, mock_reinitialize):
+        detector = AsyncAudioDetector(replace(self.config, watchdog=0.1), self.notifier)
+        detector.open_stream = MagicMock()
+        detector.open_stream.return_value.active = False
+        runtime = AsyncRuntime([detector])
+
+        main = asyncio.create_task(runtime.main())
+        await asyncio.sleep(0.01)
+        detector.get_samplerate = Mock(side_effect=ValueError('No input device matching'))  # Device unplugged
+        await asyncio.sleep(0.5)
+        runtime.stop()
+        await asyncio.wait_for(main, 1)
+
+        # Every 0.05 s without the backoff, then 0.2 s and 0.4 s apart
+        self.assertLessEqual(mock_reinitialize.call_count, 3)
+        self.notifier.set_availability.assert_called_once_with(False)
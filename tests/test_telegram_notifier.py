@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import logging
 
@@ -36,7 +36,22 @@ class TelegramNotifierTestCase(unittest.TestCase):
 
         self.mock_request.urlopen.assert_called_once()
 
+    def test_notify_outcome(self):
+        callback = Mock()
+        self.mock_request.urlopen.return_value = Mock(status=200)
+
+        self.notifier.notify(True, callback=callback)
+
+        callback.assert_called_once_with(True)
+
     def test_notify_undetected(self):
         self.notifier.notify(False)
 
         self.mock_request.urlopen.assert_not_called()
+
+    def test_api_url(self):
+        config = TelegramNotifierConfig(type='telegram', api_token='token', chat_id='chat',
+                                        api_url='http://127.0.0.1:8081/')
+        TelegramNotifier(config)
+
+        self.assertEqual('http://127.0.0.1:8081/bottoken/sendMessage', self.mock_request.Request.call_args[0][0])
@@ -0,0 +1,76 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from ringr.template import SpectralTemplate
+from ringr.exceptions import RingrDetectorError
+
+from helpers import write_wav
+
+
+def tones(frequencies, samplerate, duration, amplitude=0.2):
+    t = np.arange(int(samplerate * duration)) / samplerate
+    return sum(amplitude * np.sin(2 * np.pi * frequency * t) for frequency in frequencies)
+
+
+class SpectralTemplateTestCase(unittest.TestCase):
+    samplerate = 44100
+    fftsize = 510
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name)
+
+    def spectrum(self, samples):
+        return np.abs(np.fft.rfft(samples.reshape(-1, 1), n=self.fftsize, axis=0))
+
+    def learn(self, samples, samplerate=44100):
+        write_wav(self.path / 'template.wav', samples, samplerate)
+        return SpectralTemplate.from_wav(self.path / 'template.wav', self.samplerate, self.fftsize)
+
+    def test_match_same_sound(self):
+        template = self.learn(tones([1000, 2500, 4000], self.samplerate, 1))
+
+        # Different volume
+        correlation = template.match(self.spectrum(tones([1000, 2500, 4000], self.samplerate, 0.05, amplitude=0.05)))
+        self.assertGreater(correlation[0], 0.95)
+
+    def test_match_different_sound_same_frequency(self):
+        template = self.learn(tones([1000, 2500, 4000], self.samplerate, 1))
+
+        correlation = template.match(self.spectrum(tones([1000], self.samplerate, 0.05)))
+        self.assertLess(correlation[0], 0.7)
+
+    def test_match_multiple_channels(self):
+        template = self.learn(tones([1000, 2500], self.samplerate, 1))
+
+        block = np.stack([tones([1000, 2500], self.samplerate, 0.05), tones([6000], self.samplerate, 0.05)], axis=1)
+        correlation = template.match(np.abs(np.fft.rfft(block, n=self.fftsize, axis=0)))
+        self.assertEqual((2,), correlation.shape)
+        self.assertGreater(correlation[0], 0.95)
+        self.assertLess(correlation[1], 0.3)
+
+    def test_match_silence(self):
+        template = self.learn(tones([1000], self.samplerate, 1))
+
+        self.assertEqual(0, template.match(np.zeros((256, 1)))[0])
+
+    def test_different_samplerate(self):
+        template = self.learn(tones([1000, 2500], 22050, 1), samplerate=22050)
+
+        correlation = template.match(self.spectrum(tones([1000, 2500], self.samplerate, 0.05)))
+        self.assertGreater(correlation[0], 0.9)
+
+    def test_ignore_silence_in_clip(self):
+        clip = np.concatenate([np.zeros(44100), tones([1000, 2500], self.samplerate, 0.5), np.zeros(44100)])
+        template = self.learn(clip)
+
+        correlation = template.match(self.spectrum(tones([1000, 2500], self.samplerate, 0.05)))
+        self.assertGreater(correlation[0], 0.95)
+
+    def test_clip_too_short(self):
+        with self.assertRaises(RingrDetectorError):
+            self.learn(tones([1000], self.samplerate, 0.001))
@@ -0,0 +1,186 @@
+import json
+import time
+import threading
+import unittest
+from unittest.mock import Mock, call
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import logging
+
+from ringr.exceptions import RingrDetectorError
+from ringr.notifiers import Detection
+from ringr.notifiers.webhook_notifier import WebhookNotifier, WebhookNotifierConfig, render
+
+
+# Don't show logging messages while testing
+logging.disable(logging.CRITICAL)
+
+
+class WebhookServer(ThreadingHTTPServer):
+    """ Local endpoint recording the posted requests and the client ports """
+
+    def __init__(self):
+        self.requests = []
+        self.ports = set()
+        self.status = 200
+        self.delay = 0
+        self.close_idle = False  # close kept-alive connections without telling the client
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                self.server.requests.append((self.path, dict(self.headers), json.loads(body)))
+                self.server.ports.add(self.client_address[1])
+                time.sleep(self.server.delay)
+                self.send_response(self.server.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                self.close_connection = self.server.close_idle
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server_address[1]}/events?source=ringr'
+
+
+class WebhookNotifierTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = WebhookServer()
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def create_notifier(self, **kwargs):
+        config = WebhookNotifierConfig(type='webhook', url=self.server.url, **kwargs)
+        return WebhookNotifier(config)
+
+    def test_notify(self):
+        notifier = self.create_notifier(token='secret')
+        notifier.notify(True, Detection(1000.5, 0.8, 'frequency:1000'))
+        notifier.notify(False)
+        notifier.close()
+
+        self.assertEqual(1, len(self.server.requests))
+        path, headers, body = self.server.requests[0]
+        self.assertEqual('/events?source=ringr', path)
+        self.assertEqual('Bearer secret', headers['Authorization'])
+        self.assertEqual({'device_id': 'ringr_01', 'rule': 'frequency:1000', 'time': 1000.5, 'confidence': 0.8}, body)
+
+    def test_template(self):
+        notifier = self.create_notifier(template='{"sensor": "doorbell", "data": {"at": "$iso_time", '
+                                                 '"score": "$confidence", "text": "$rule by $device_id"}}')
+        notifier.notify(True, Detection(0, 0.8, 'frequency:1000'))
+        notifier.close()
+
+        self.assertEqual({'sensor': 'doorbell', 'data': {'at': '1970-01-01T00:00:00+00:00', 'score': 0.8,
+                                                         'text': 'frequency:1000 by ringr_01'}},
+                         self.server.requests[0][2])
+
+    def test_keep_alive(self):
+        notifier = self.create_notifier()
+        for i in range(5):
+            notifier.notify(True, Detection(i, 0.8))
+        notifier.close()
+
+        self.assertEqual(5, len(self.server.requests))
+        # All requests are sent through the same connection
+        self.assertEqual(1, len(self.server.ports))
+
+    def test_batch(self):
+        notifier = self.create_notifier(batch_size=3, batch_latency=10)
+        for i in range(5):
+            notifier.notify(True, Detection(i, 0.8))
+        notifier.close()
+
+        self.assertEqual([[0, 1, 2], [3, 4]], [[event['time'] for event in body]
+                                               for _, _, body in self.server.requests])
+
+    def test_batch_latency(self):
+        notifier = self.create_notifier(batch_size=100, batch_latency=0.05)
+        notifier.notify(True, Detection(0, 0.8))
+
+        # Posted after the latency window, without waiting for more detections
+        for _ in range(100):
+            if self.server.requests:
+                break
+            time.sleep(0.01)
+        self.assertEqual(1, len(self.server.requests))
+        notifier.close()
+
+    def test_error_status(self):
+        self.server.status = 500
+        notifier = self.create_notifier()
+        notifier.notify(True, Detection(0, 0.8))
+        notifier.notify(True, Detection(1, 0.8))
+        notifier.close()
+
+        # Errors are logged, the next detections are still posted
+        self.assertEqual(2, len(self.server.requests))
+
+    def test_outcome(self):
+        notifier = self.create_notifier()
+        delivered = Mock()
+        notifier.notify(True, Detection(0, 0.8), delivered)
+        notifier.close()
+
+        self.server.status = 500
+        notifier = self.create_notifier()
+        failed = Mock()
+        notifier.notify(True, Detection(1, 0.8), failed)
+        notifier.close()
+
+        delivered.assert_called_once_with(True)
+        failed.assert_called_once_with(False)
+
+    def test_default_confidence(self):
+        notifier = self.create_notifier()
+        notifier.notify(True)
+        notifier.close()
+
+        self.assertEqual(0.0, self.server.requests[0][2]['confidence'])
+
+    def test_retry_closed_connection(self):
+        self.server.close_idle = True
+        notifier = self.create_notifier()
+        outcome = Mock()
+        notifier.notify(True, Detection(0, 0.8), outcome)
+        for _ in range(100):
+            if outcome.called:
+                break
+            time.sleep(0.01)
+        notifier.notify(True, Detection(1, 0.8), outcome)
+        notifier.close()
+
+        # The second detection is posted again through a new connection
+        self.assertEqual([0, 1], [body['time'] for _, _, body in self.server.requests])
+        self.assertEqual(2, len(self.server.ports))
+        self.assertEqual([call(True), call(True)], outcome.call_args_list)
+
+    def test_no_retry_after_timeout(self):
+        self.server.delay = 0.2
+        notifier = self.create_notifier(timeout=0.05)
+        outcome = Mock()
+        notifier.notify(True, Detection(0, 0.8), outcome)
+        notifier.close()
+
+        # The server may have received the detection, it is not posted again
+        time.sleep(0.3)
+        self.assertEqual(1, len(self.server.requests))
+        outcome.assert_called_once_with(False)
+
+    def test_invalid_config(self):
+        with self.assertRaises(RingrDetectorError):
+            self.create_notifier(template='{"time": $time}')
+        with self.assertRaises(RingrDetectorError):
+            WebhookNotifier(WebhookNotifierConfig(type='webhook', url='ftp://localhost/events'))
+
+
+class RenderTestCase(unittest.TestCase):
+    def test_render(self):
+        template = {'a': ['$x', '$y', 'x=$x'], 'b': '$unknown', 'c': 1}
+
+        self.assertEqual({'a': [1.5, None, 'x=1.5'], 'b': '$unknown', 'c': 1}, render(template, {'x': 1.5, 'y': None}))